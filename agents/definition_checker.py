@@ -1,14 +1,26 @@
 import re
-import json
 import logging
 from nltk.stem import SnowballStemmer
-from utils.api_clients import AnthropicClient, OpenAIClient
+from jsonschema.exceptions import ValidationError
+from utils.model_cascade import create_cascade_client
+from utils.metrics import instrumented, record_validation_failure
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s - %(filename)s - %(funcName)s')
 
 advanced_model = "claude-3-5-sonnet-20240620"
 affordable_model = "claude-3-haiku-20240307"
 
+AUDIT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "valid": {"type": "boolean"},
+        "issues": {"type": "array", "items": {"type": "string"}},
+        "suggestions": {"type": "array", "items": {"type": "string"}}
+    },
+    "required": ["valid", "issues", "suggestions"],
+    "additionalProperties": False
+}
+
 class DefinitionChecker:
     SUPPORTED_LANGUAGES = {
         'english': 'english',
@@ -19,14 +31,10 @@ class DefinitionChecker:
     def __init__(self, api_type="anthropic", model="claude-3-haiku-20240307"):
         self.client = self._create_client(api_type, model)
         self.api_type = api_type
+        self.max_tokens = 512
 
     def _create_client(self, api_type, model):
-        if api_type.lower() == "openai":
-            return OpenAIClient(model)
-        elif api_type.lower() == "anthropic":
-            return AnthropicClient(model)
-        else:
-            raise ValueError("Invalid api_type. Choose 'openai' or 'anthropic'.")
+        return create_cascade_client(api_type, model, agent="DefinitionChecker")
 
     def check_definition(self, word, definition, language, pos=None):
         language = language.lower()
@@ -56,6 +64,7 @@ class DefinitionChecker:
         
         return None
 
+    @instrumented("llm_audit")
     def llm_audit(self, word, definition, language, pos=None):
         prompt = f"""
         Language: {language}
@@ -79,16 +88,21 @@ class DefinitionChecker:
         """
 
         system = "You are an expert lexicographer tasked with auditing definitions for language learners. You only output json"
-        if self.api_type == "openai":
-            messages = [
-                {"role": "system", "content": system},
-                {"role": "user", "content": prompt}
-            ]
-            result = json.loads(self.client.create_chat_completion(messages, system=None))
-        else:
-            messages = [ {"role": "user", "content": prompt} ]
-            result = json.loads(self.client.create_chat_completion(messages, system=system))
-        return result['valid']
+        try:
+            if self.api_type == "openai":
+                messages = [
+                    {"role": "system", "content": system},
+                    {"role": "user", "content": prompt}
+                ]
+                response = self.client.create_structured_completion(messages, AUDIT_SCHEMA, system=None, max_tokens=self.max_tokens, name="audit")
+            else:
+                messages = [ {"role": "user", "content": prompt} ]
+                response = self.client.create_structured_completion(messages, AUDIT_SCHEMA, system=system, max_tokens=self.max_tokens, name="audit")
+        except ValidationError:
+            self.client.reject_last_response()
+            record_validation_failure("DefinitionChecker")
+            raise
+        return response['valid']
 
 # Usage
 if __name__ == "__main__":
@@ -1,8 +1,10 @@
 import json
 import logging
 from pathlib import Path
-from utils.api_clients import OpenAIClient, AnthropicClient
-from utils.definition_utils import get_enumeration, add_definition_to_db, split_dictionary_content
+from jsonschema.exceptions import ValidationError
+from utils.model_cascade import create_cascade_client
+from utils.metrics import instrumented, record_retry, record_validation_failure
+from utils.definition_utils import add_definition_to_db, split_dictionary_content
 from agents.dict_entry_analyzer import DictEntryAnalyzer
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s - %(filename)s - %(funcName)s')
@@ -10,6 +12,28 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 advanced_model = "claude-3-5-sonnet-20240620"
 affordable_model = "claude-3-haiku-20240307"
 
+EXTRACTION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "word": {"type": "string"},
+        "definitions": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "def": {"type": "string"},
+                    "pos": {"type": "string"},
+                    "inf_pos": {"type": "string"},
+                    "phrases": {"type": "array", "items": {"type": "string"}},
+                    "ai_phrase": {"type": "string"}
+                },
+                "required": ["def"]
+            }
+        }
+    },
+    "required": ["word", "definitions"]
+}
+
 class DefinitionExtractor:
     def __init__(self, language="English", api_type="anthropic", model=affordable_model):
         self.language = language
@@ -17,6 +41,8 @@ class DefinitionExtractor:
         self.model = model
         self.client = self._create_client()
         self.max_retries = 3
+        # Full dictionary entries can carry dozens of definitions.
+        self.max_tokens = 4096
         self.data_dir = Path("data")
         if not Path.exists(self.data_dir):
             Path.mkdir(self.data_dir, parents=True)
@@ -63,13 +89,9 @@ class DefinitionExtractor:
         )
 
     def _create_client(self):
-        if self.api_type.lower() == "openai":
-            return OpenAIClient(self.model)
-        elif self.api_type.lower() == "anthropic":
-            return AnthropicClient(self.model)
-        else:
-            raise ValueError(f"Unsupported API type: {self.api_type}")
+        return create_cascade_client(self.api_type, self.model, agent="DefinitionExtractor", prompt_caching=True)
 
+    @instrumented("extract_definitions")
     def extract_definitions(self, word, dictionary_entry, number_count=None):
         retries = 0
         while retries < self.max_retries:
@@ -86,14 +108,16 @@ class DefinitionExtractor:
                     }
                 
                 if self.api_type == "openai":
-                    response = self.client.create_chat_completion([{"role": "system", "content": self.system_message}, message], system=None)
+                    extracted_data = self.client.create_structured_completion([{"role": "system", "content": self.system_message}, message], EXTRACTION_SCHEMA, system=None, max_tokens=self.max_tokens, name="definitions")
                 else:
-                    response = self.client.create_chat_completion([message], system=self.system_message)
-
-                extracted_data = json.loads(response)
+                    extracted_data = self.client.create_structured_completion([message], EXTRACTION_SCHEMA, system=self.system_message, max_tokens=self.max_tokens, name="definitions")
                 return extracted_data
             except Exception as e:
                 logging.error(f"Error extracting definitions: {e}")
+                self.client.reject_last_response()
+                if isinstance(e, ValidationError):
+                    record_validation_failure("DefinitionExtractor")
+                record_retry("DefinitionExtractor")
                 retries += 1
                 if retries == self.max_retries:
                     raise Exception("Max retries reached. Unable to extract definitions.")
@@ -110,17 +134,6 @@ class DefinitionExtractor:
                 "definition": definition["def"],
                 "phrases": definition.get("phrases") or [definition.get("ai_phrase", "")]
             }
-            try:
-                enumeration = word + '_' + get_enumeration(word)
-            except Exception as e:
-                logging.info("initializing first entry.")
-                enumeration = word + "_1"
-                entry["enumeration"] = enumeration
-                logging.info(f"\n-------------- entry: {entry} --------- \n")
-                add_definition_to_db(entry)
-                continue
-
-            entry["enumeration"] = enumeration
             logging.info(f"\n-------------- entry: {entry} --------- \n")
             add_definition_to_db(entry)
 
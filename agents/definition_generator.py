@@ -1,7 +1,6 @@
 import json
 import csv
 import logging
-from jsonschema import validate
 from jsonschema.exceptions import ValidationError
 from pathlib import Path
 from logging.handlers import RotatingFileHandler
@@ -15,7 +14,12 @@ from agents.definition_checker import DefinitionChecker
 import lexiwebdb.client.src.operations.app_ops as app_ops
 import lexiwebdb.client.src.operations.enumerated_lemma_ops as enumerated_lemma_ops
 
-from utils.api_clients import OpenAIClient, AnthropicClient
+from utils.model_cascade import create_cascade_client
+from utils.agent_registry import get_agent
+from utils.batch_clients import create_batch_client, make_batch_request
+from utils.metrics import instrumented, record_retry, record_validation_failure
+from utils.prompt_encoder import encode_phrase_info, DEFINITION_FIELDS
+from utils.structured_output import parse_structured_output
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s - %(filename)s - %(funcName)s')
@@ -27,18 +31,15 @@ class DefinitionGenerator:
         self.language = language
         self.native_language = native_language
         self.max_retries = 3
+        self.max_tokens = 512
+        self.schema = self.get_validation_schema()
         self.min_definitions = 1
         self.api_type = api_type
 
-        if api_type.lower() == "openai":
-            self.client = OpenAIClient(model)
-        elif api_type.lower() == "anthropic":
-            self.client = AnthropicClient(model)
-        else:
-            raise ValueError("Invalid api_type. Choose 'openai' or 'anthropic'.")
+        self.client = create_cascade_client(api_type, model, agent="DefinitionGenerator", prompt_caching=True)
 
-        self.matcher = Matcher(list_filepath, language, native_language, api_type, model)
-        self.definition_checker = DefinitionChecker(api_type=api_type, model=model)
+        self.matcher = get_agent(Matcher, list_filepath=list_filepath, language=language, native_language=native_language, api_type=api_type, model=model)
+        self.definition_checker = get_agent(DefinitionChecker, api_type=api_type, model=model)
 
         self.base_word_phrase = {
             "word": "word",
@@ -71,6 +72,9 @@ class DefinitionGenerator:
         file_handler = RotatingFileHandler(log_file, mode='a', maxBytes=5*1024*1024, backupCount=2)
         file_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
         logging.getLogger().addHandler(file_handler)
+
+        # Loaded here so the shared instance from get_agent is ready before any thread uses it.
+        self.load_and_initialize()
         
     def initialize_instructions(self, translate=False):
         if translate:
@@ -153,7 +157,8 @@ class DefinitionGenerator:
                         "word": {"type": "string"},
                         "def": {"type": "string"}
                     },
-                    "required": ["word", "def"]
+                    "required": ["word", "def"],
+                    "additionalProperties": False
                 }
             return schema
         except Exception as e:
@@ -161,6 +166,34 @@ class DefinitionGenerator:
             return None
 
 
+    def build_definition_message(self, *, word: str, phrase: str, pos: str, phrase_info: str = None):
+        message = {
+            "role": "user", "content": f"{self.translated_word_phrase.get('word', 'word')}: {word}."\
+            f" {self.translated_word_phrase.get('phrase', 'phrase')}: {phrase}."\
+            f" {self.translated_word_phrase.get('pos', 'part of speech')}: {pos}."
+
+        }
+        if phrase_info:
+            message["content"] += f"\n{encode_phrase_info(phrase_info, DEFINITION_FIELDS)}"
+        return message
+
+    def check_generated_definition(self, word, response_message, phrase_info):
+        stanza_pos = find_pos_in_phrase_info(word, phrase_info)
+
+        # Check if the definition is valid
+        is_valid = self.definition_checker.check_definition(word, response_message['def'], self.language)
+        if not is_valid and stanza_pos != 'DET':
+            raise ValueError("Definition contains the word being defined or a closely related form.")
+
+    def make_entry(self, word, pos, definition):
+        return {
+            "enumeration": word + '_' + get_enumeration(word),
+            "base_lemma": word,
+            "part_of_speech": pos,
+            "definition": definition
+        }
+
+    @instrumented("generate_definition_for_word")
     def generate_definition_for_word(self, 
                                      *, 
                                      word: str, 
@@ -171,58 +204,46 @@ class DefinitionGenerator:
         max_retries = self.max_retries
         retries = 0
         success = False
-        message = {
-            "role": "user", "content": f"{self.translated_word_phrase.get('word', 'word')}: {word}."\
-            f" {self.translated_word_phrase.get('phrase', 'phrase')}: {phrase}."\
-            f" {self.translated_word_phrase.get('pos', 'part of speech')}: {pos}."
-
-        }
-        if phrase_info:
-            message["content"] += f"\n{phrase_info}"
+        message = self.build_definition_message(word=word, phrase=phrase, pos=pos, phrase_info=phrase_info)
 
         logging.info(f"message: {message}")
-        self.messages.append(message)
-        back_up_messages = self.messages.copy()
+        messages = self.messages.copy()
+        messages.append(message)
+        back_up_messages = messages.copy()
         logging.info(f"entering generate_definitions_for_word with message: {message}")
 
         while not success and retries < max_retries:
             try:
                 if self.api_type == "openai":
-                    response_message = json.loads(self.client.create_chat_completion(self.messages, system=None))
+                    response_message = self.client.create_structured_completion(messages, self.schema, system=None, max_tokens=self.max_tokens, name="definition")
                 else:
-                    response_message = json.loads(self.client.create_chat_completion(self.messages, system=self.system_message))
+                    response_message = self.client.create_structured_completion(messages, self.schema, system=self.system_message, max_tokens=self.max_tokens, name="definition")
                 logging.info(f"response_message: {response_message}")
-                validate(instance=response_message, schema=self.get_validation_schema())
-
-                stanza_pos = find_pos_in_phrase_info(word, phrase_info)
-
-                # Check if the definition is valid
-                is_valid = self.definition_checker.check_definition(word, response_message['def'], self.language)
-                if not is_valid and stanza_pos != 'DET':
-                    raise ValueError("Definition contains the word being defined or a closely related form.")
-                
-                entry = {
-                    "enumeration": word + '_' + get_enumeration(word) if get_enumeration(word) else word + '_1',
-                    "base_lemma": word,
-                    "part_of_speech": pos,
-                    "definition": response_message['def']
-                }
-                entries.append(entry)
+                self.check_generated_definition(word, response_message, phrase_info)
+                entries.append(self.make_entry(word, pos, response_message['def']))
                 success = True
             except ValidationError as ve:
                 logging.error(f"Validation error: {ve}")
+                self.client.reject_last_response()
+                record_validation_failure("DefinitionGenerator")
+                record_retry("DefinitionGenerator")
                 error_message = {"role": "user", "content": f"Error: {ve}"}
                 back_up_messages.append(error_message)
-                self.messages = back_up_messages
+                messages = back_up_messages.copy()
                 retries += 1
             except ValueError as ve:
                 logging.error(f"Definition check failed: {ve}")
+                self.client.reject_last_response()
+                record_validation_failure("DefinitionGenerator")
+                record_retry("DefinitionGenerator")
                 error_message = {"role": "user", "content": f"Error: {ve}. Please provide a definition that does not use the word '{word}' or closely related forms."}
                 back_up_messages.append(error_message)
-                self.messages = back_up_messages
+                messages = back_up_messages.copy()
                 retries += 1
             except Exception as e:
                 logging.error(f"Error: {e}")
+                self.client.reject_last_response()
+                record_retry("DefinitionGenerator")
                 retries += 1
                 if retries >= max_retries:
                     logging.error(f"Failed to generate definitions for word '{word}' after {max_retries} attempts.")
@@ -263,6 +284,51 @@ class DefinitionGenerator:
         for entry in entries:
             add_definition_to_db(entry)
 
+    def run_batch(self, items: list, batch_client=None, timeout=None):
+        """
+        Generate definitions for many words through one provider batch job.
+
+        Each batch result goes through the same validation and definition check as
+        the interactive path; rejected or missing results are retried interactively.
+
+        :param items: Dicts with `word`, `phrase`, `pos` and optionally `phrase_info`.
+        :param batch_client: BatchClient to submit with, defaults to one for this generator's provider.
+        :param timeout: Seconds to wait for the batch before giving up.
+        :return: The entries that were added to the database.
+        """
+        batch_client = batch_client or create_batch_client(self.api_type, self.model, agent="DefinitionGenerator")
+        system = None if self.api_type == "openai" else self.system_message
+        requests = []
+        for index, item in enumerate(items):
+            messages = self.messages.copy()
+            messages.append(self.build_definition_message(
+                word=item['word'], phrase=item['phrase'], pos=item['pos'], phrase_info=item.get('phrase_info')
+            ))
+            requests.append(make_batch_request(f"def-{index}", messages, system=system, max_tokens=self.max_tokens, schema=self.schema, name="definition"))
+
+        results = batch_client.run(requests, timeout=timeout)
+
+        entries = []
+        for request, item in zip(requests, items):
+            word = item['word']
+            try:
+                response = results.get(request["custom_id"])
+                if response is None:
+                    raise ValueError("No result returned by the batch job.")
+                response_message = parse_structured_output(response, self.schema)
+                self.check_generated_definition(word, response_message, item.get('phrase_info'))
+                entries.append(self.make_entry(word, item['pos'], response_message['def']))
+            except Exception as e:
+                logging.error(f"Batch definition for '{word}' rejected ({e}), retrying interactively.")
+                batch_client.reject(request)
+                self.generate_definition_for_word(
+                    word=word, phrase=item['phrase'], pos=item['pos'], phrase_info=item.get('phrase_info'), entries=entries
+                )
+
+        for entry in entries:
+            add_definition_to_db(entry)
+        return entries
+
 
 if __name__ == "__main__":
     definition_generator = DefinitionGenerator()
@@ -331,5 +397,4 @@ if __name__ == "__main__":
                         ]
                     }
                 ]
-    definition_generator.load_and_initialize()
     definition_generator.run_single_word(word=word, phrase=phrase, phrase_info=phrase_info, entries=entries, pos=pos)
@@ -2,13 +2,28 @@ import json
 import logging
 import re
 from pathlib import Path
-from utils.api_clients import OpenAIClient, AnthropicClient
+from jsonschema.exceptions import ValidationError
+from utils.model_cascade import create_cascade_client
+from utils.metrics import instrumented, record_retry, record_validation_failure
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s - %(filename)s - %(funcName)s')
 
 advanced_model = "claude-3-5-sonnet-20240620"
 affordable_model = "claude-3-haiku-20240307"
 
+ANALYSIS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "number_count": {"type": "integer"},
+        "primary_definitions": {"type": "integer"},
+        "estimated_total_definitions": {"type": "integer"},
+        "extremely_liberal_def_estimate": {"type": "integer"},
+        "split": {"type": "boolean"}
+    },
+    "required": ["number_count", "primary_definitions", "estimated_total_definitions", "extremely_liberal_def_estimate", "split"],
+    "additionalProperties": False
+}
+
 class DictEntryAnalyzer:
     def __init__(self, language, native_language, api_type="anthropic", model=advanced_model):
         self.language = language
@@ -17,6 +32,7 @@ class DictEntryAnalyzer:
         self.model = model
         self.client = self._create_client()
         self.max_retries = 3
+        self.max_tokens = 256
         self.data_dir = Path("data/")
 
         self.example_input_file = self.data_dir / "definitions" / "japanese_example.txt"
@@ -67,16 +83,12 @@ class DictEntryAnalyzer:
             self.messages = []
 
     def _create_client(self):
-        if self.api_type.lower() == "openai":
-            return OpenAIClient(self.model)
-        elif self.api_type.lower() == "anthropic":
-            return AnthropicClient(self.model)
-        else:
-            raise ValueError(f"Unsupported API type: {self.api_type}")
+        return create_cascade_client(self.api_type, self.model, agent="DictEntryAnalyzer")
 
     def count_numbers(self, text):
         return len(re.findall(r'\b\d+\b', text))
 
+    @instrumented("analyze_entry")
     def analyze_entry(self, word, entry):
         input_data = {
             "word": word,
@@ -93,14 +105,16 @@ class DictEntryAnalyzer:
         while retries < self.max_retries:
             try:
                 if self.api_type == "openai":
-                    response = self.client.create_chat_completion(self.messages, system=None)
+                    analysis = self.client.create_structured_completion(self.messages, ANALYSIS_SCHEMA, system=None, max_tokens=self.max_tokens, name="entry_analysis")
                 else:
-                    response = self.client.create_chat_completion(self.messages, system=self.system_message)
-
-                analysis = json.loads(response)
+                    analysis = self.client.create_structured_completion(self.messages, ANALYSIS_SCHEMA, system=self.system_message, max_tokens=self.max_tokens, name="entry_analysis")
                 return analysis
             except Exception as e:
                 logging.error(f"Error analyzing entry: {e}")
+                self.client.reject_last_response()
+                if isinstance(e, ValidationError):
+                    record_validation_failure("DictEntryAnalyzer")
+                record_retry("DictEntryAnalyzer")
                 retries += 1
 
         logging.error("Max retries reached. Unable to analyze entry.")
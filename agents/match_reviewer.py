@@ -1,8 +1,11 @@
 import json
 import logging
-from jsonschema import validate
 from jsonschema.exceptions import ValidationError
-from utils.api_clients import OpenAIClient, AnthropicClient
+from utils.model_cascade import create_cascade_client
+from utils.batch_clients import create_batch_client, make_batch_request
+from utils.metrics import instrumented, record_retry, record_validation_failure
+from utils.prompt_encoder import encode_match_input, compact_json, REVIEWER_FIELDS
+from utils.structured_output import parse_structured_output
 
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s - %(filename)s - %(funcName)s')
@@ -13,14 +16,11 @@ class MatchReviewer:
         self.native_language = native_language
         self.model = model
         self.max_retries = 3
+        self.max_tokens = 32
+        self.schema = self.get_validation_schema()
         self.api_type = api_type
 
-        if api_type.lower() == "openai":
-            self.client = OpenAIClient(model)
-        elif api_type.lower() == "anthropic":
-            self.client = AnthropicClient(model)
-        else:
-            raise ValueError("Invalid api_type. Choose 'openai' or 'anthropic'.")
+        self.client = create_cascade_client(api_type, model, agent="MatchReviewer", prompt_caching=True)
 
         self.example_input = {
             "phrase": "The boy played with his top.",
@@ -149,10 +149,11 @@ class MatchReviewer:
             "definition": "A toy that can be spun and maintain its balance until it loses momentum"
         }
         self.base_instructions = "You are a helpful assistant that verifies that the definition is correct for " \
-            f"a given base_lemma. You will take a dictionary like this: {json.dumps(self.example_input, indent=4)} " \
+            f"a given base_lemma. You will take a dictionary like this: {encode_match_input(self.example_input, REVIEWER_FIELDS)} " \
+            "`phrase_info` is a `|`-separated token table. " \
             "You will use the phrase for context to determine whether or not the definiton matches the base lemma. " \
             "You will strictly output json with a single key: `Is_Correct` and the value will be a boolean: " \
-            f"{json.dumps(self.example_output_False, indent=4)} or {json.dumps(self.example_output_True, indent=4)}"
+            f"{compact_json(self.example_output_False)} or {compact_json(self.example_output_True)}"
 
         self.system_message = self.base_instructions
         self.base_message = {
@@ -172,50 +173,77 @@ class MatchReviewer:
                 "properties": {
                     "Is_Correct": {"type": "boolean"}
                 },
-                "required": ["Is_Correct"]
+                "required": ["Is_Correct"],
+                "additionalProperties": False
             }
             return schema
         except Exception as e:
             logging.error(f"Error getting validation schema: {e}")
             return None
 
+    @instrumented("review_matches")
     def review_matches(self, match_to_validate):
         max_retries = self.max_retries
         retries = 0
-        self.messages.append({
+        messages = self.messages.copy()
+        messages.append({
             "role": "user",
-            "content": json.dumps(match_to_validate, indent=4, ensure_ascii=False)
+            "content": encode_match_input(match_to_validate, REVIEWER_FIELDS)
         })
-        logging.info(f"Messages: {self.messages}")
-        backup_messages = self.messages.copy()
+        logging.info(f"Messages: {messages}")
+        backup_messages = messages.copy()
 
         while retries < max_retries:
             try:
                 if self.api_type == "openai":
-                    response_message = json.loads(self.client.create_chat_completion(self.messages, system=None))
+                    response_message = self.client.create_structured_completion(messages, self.schema, system=None, max_tokens=self.max_tokens, name="review")
                 else:
-                    response_message = json.loads(self.client.create_chat_completion(self.messages, system=self.system_message))
-                try:
-                    validate(instance=response_message, schema=self.get_validation_schema())
-                    logging.info(f"\n\nresponse_message: {json.dumps(response_message, indent=4)}")
-                    logging.info(f"\n\nresponse_message['Is_Correct']: {response_message['Is_Correct']}")
-                    is_correct = response_message['Is_Correct']
-                    logging.info(f"\n\nIs_Correct value: {is_correct}")
-                    return is_correct
-                except ValidationError as e:
-                    logging.error(f"Validation error: {e}")
-                    raise e
+                    response_message = self.client.create_structured_completion(messages, self.schema, system=self.system_message, max_tokens=self.max_tokens, name="review")
+                logging.info(f"\n\nresponse_message: {json.dumps(response_message, indent=4)}")
+                is_correct = response_message['Is_Correct']
+                logging.info(f"\n\nIs_Correct value: {is_correct}")
+                return is_correct
             except Exception as e:
                 retries += 1
-                self.messages = backup_messages
+                messages = backup_messages.copy()
+                if isinstance(e, ValidationError):
+                    record_validation_failure("MatchReviewer")
+                record_retry("MatchReviewer")
+                self.client.reject_last_response()
                 logging.error(f"Error reviewing matches: {e}")
         return None
     
+    def review_matches_batch(self, matches_to_validate, batch_client=None, timeout=None):
+        """
+        Review many matches in one provider batch job.
+
+        :return: A list of `Is_Correct` values aligned with `matches_to_validate`;
+                 matches whose batch result is invalid are reviewed interactively.
+        """
+        batch_client = batch_client or create_batch_client(self.api_type, self.model, agent="MatchReviewer")
+        system = None if self.api_type == "openai" else self.system_message
+        requests = []
+        for index, match_to_validate in enumerate(matches_to_validate):
+            messages = self.messages.copy()
+            messages.append({
+                "role": "user",
+                "content": encode_match_input(match_to_validate, REVIEWER_FIELDS)
+            })
+            requests.append(make_batch_request(f"review-{index}", messages, system=system, max_tokens=self.max_tokens, schema=self.schema, name="review"))
+        results = batch_client.run(requests, timeout=timeout)
+
+        reviews = []
+        for request, match_to_validate in zip(requests, matches_to_validate):
+            try:
+                response_message = parse_structured_output(results[request["custom_id"]], self.schema)
+                reviews.append(response_message['Is_Correct'])
+            except Exception as e:
+                logging.error(f"Batch review rejected ({e}), retrying interactively.")
+                batch_client.reject(request)
+                reviews.append(self.review_matches(match_to_validate))
+        return reviews
+
     def run(self, match_to_validate):
-        if self.api_type == "openai":
-            self.messages = [self.base_message]
-        else:
-            self.messages = []
         return self.review_matches(match_to_validate)
 
 
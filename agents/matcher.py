@@ -1,13 +1,15 @@
-import json
 import logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s - %(filename)s')
 from pathlib import Path
-from jsonschema import validate
 from jsonschema.exceptions import ValidationError
-from lexiwebdb.client.src.operations import enumerated_lemma_ops
 from stanza.client.src.operations.app_ops import process_text, select_language, language_abreviations
 from agents.match_reviewer import MatchReviewer
-from utils.api_clients import OpenAIClient, AnthropicClient
+from utils.model_cascade import create_cascade_client
+from utils.agent_registry import get_agent
+from utils.bulk_writer import get_bulk_writer
+from utils.lemma_cache import get_enumerated_lemmas
+from utils.metrics import instrumented, record_retry, record_validation_failure
+from utils.prompt_encoder import encode_match_input, compact_json, MATCHER_FIELDS
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s - %(filename)s')
 
@@ -19,8 +21,11 @@ class Matcher:
         self.api_type = api_type
         self.model = model
         self.client = self._create_client()
-        self.match_reviewer = MatchReviewer(language, native_language, api_type, model)
-        self.max_retries = 1
+        self.match_reviewer = get_agent(MatchReviewer, language=language, native_language=native_language, api_type=api_type, model=model)
+        # One attempt per model in the cascade: a rejected match is retried on the advanced model.
+        self.max_retries = self.client.tiers
+        self.max_tokens = 64
+        self.schema = self.get_validation_schema()
         self.string_list = []
         self.definitions = []
         self.example_input = {
@@ -91,10 +96,11 @@ class Matcher:
             }
         }
         self.base_instructions = "You are a helpful assistant that matches base lemmas with their correct " \
-            f"enumerated lemmas in a given phrase. You will take a dictionary like this: {json.dumps(self.example_input, indent=4, ensure_ascii=False)} " \
+            f"enumerated lemmas in a given phrase. You will take a dictionary like this: {encode_match_input(self.example_input, MATCHER_FIELDS)} " \
+            "`phrase_info` is a `|`-separated token table and `definitions` lists `id|pos|def` rows. " \
             "You will use the phrase for context to determine which enumeration is the correct one. You will " \
             "output json with a single key: `Matched Lemma` and the value will be the correct enumerated lemma: " \
-            f"{json.dumps(self.get_validation_schema(), indent=4, ensure_ascii=False)}"
+            f"{compact_json(self.get_validation_schema())}"
         
         self.system_message = self.base_instructions
         self.base_message = {
@@ -107,18 +113,12 @@ class Matcher:
             self.messages = []
 
     def _create_client(self):
-        if self.api_type.lower() == "openai":
-            return OpenAIClient(self.model)
-        elif self.api_type.lower() == "anthropic":
-            return AnthropicClient(self.model)
-        else:
-            raise ValueError(f"Unsupported API type: {self.api_type}")
+        return create_cascade_client(self.api_type, self.model, agent="Matcher", prompt_caching=True)
 
     def load_definitions(self, base_lemma):
-        response = enumerated_lemma_ops.get_enumerated_lemma_by_base_lemma(base_lemma)
-        logging.info(f"Response: {response.json()}")
-        if response.status_code == 200:
-            return response.json()['enumerated_lemmas']
+        enumerated_lemmas = get_enumerated_lemmas(base_lemma)
+        if enumerated_lemmas is not None:
+            return enumerated_lemmas
         else:
             logging.error(f"Error: Unable to load definitions for base lemma '{base_lemma}' from the database.")
             return []
@@ -132,25 +132,30 @@ class Matcher:
         except Exception as e:
             logging.error(f"Error loading list from {self.list_filepath}: {e}")
 
+    @instrumented("match_lemmas")
     def match_lemmas(self, input_data):
-        max_retries = 1
+        """
+        Match the phrase to one of `input_data['definitions']`.
+
+        Every failed attempt is retried on the next model tier. A match the reviewer rejects is
+        also dropped from the definitions, so the retry only offers the remaining ones.
+        """
+        max_retries = self.max_retries
         retries = 0
         success = False
-        message = {"role": "user", "content": json.dumps(input_data, indent=4, ensure_ascii=False)}
-        self.messages.append(message)
-        back_up_messages = self.messages.copy()
 
-        while not success and retries < max_retries:
+        while not success and retries < max_retries and input_data['definitions']:
+            # Rebuilt on every attempt so a definition the reviewer rejected is no longer offered.
+            messages = self.messages.copy()
+            messages.append({"role": "user", "content": encode_match_input(input_data, MATCHER_FIELDS)})
             try:
                 if self.api_type == "openai":
-                    response_message = json.loads(self.client.create_chat_completion(self.messages, system=None))
+                    response_message = self.client.create_structured_completion(messages, self.schema, system=None, max_tokens=self.max_tokens, name="match")
                 else:
-                    response_message = json.loads(self.client.create_chat_completion(self.messages, system=self.system_message))
+                    response_message = self.client.create_structured_completion(messages, self.schema, system=self.system_message, max_tokens=self.max_tokens, name="match")
 
                 logging.info(f"\n\n----> response_message: {response_message}")
 
-                validate(instance=response_message, schema=self.get_validation_schema())
-
                 matched_lemma = response_message['Matched Lemma']
                 definition_to_validate = input_data['definitions'][matched_lemma]['def']
 
@@ -160,20 +165,24 @@ class Matcher:
                     'phrase_info': input_data['phrase_info'],
                     'definition': definition_to_validate
                 }
+                if 'surface_form' in input_data:
+                    match_to_validate['surface_form'] = input_data['surface_form']
 
                 is_valid = self.match_reviewer.run(match_to_validate)
                 if is_valid:
                     success = True
                     return response_message, success
-                else:
-                    logging.info(f"Definition is not valid for base lemma '{input_data['base_lemma']}': {definition_to_validate}")
-                    input_data['definitions'].pop(matched_lemma)
-                    raise Exception(f"Definition is not valid for base lemma '{input_data['base_lemma']}': {definition_to_validate}")
+                logging.info(f"Definition is not valid for base lemma '{input_data['base_lemma']}': {definition_to_validate}")
+                input_data['definitions'].pop(matched_lemma)
+                self.client.reject_last_response(revised=True)
             except (ValidationError, Exception) as e:
                 logging.error(f"Error: {e}")
-                retries += 1
-                self.messages = back_up_messages
-                logging.info(f"Retrying... ({retries}/{max_retries})")
+                self.client.reject_last_response()
+                if isinstance(e, (ValidationError, KeyError)):
+                    record_validation_failure("Matcher")
+            record_retry("Matcher")
+            retries += 1
+            logging.info(f"Retrying... ({retries}/{max_retries})")
 
         return None, success
 
@@ -183,7 +192,8 @@ class Matcher:
             "properties": {
                 "Matched Lemma": {"type": "string"},
             },
-            "required": ["Matched Lemma"]
+            "required": ["Matched Lemma"],
+            "additionalProperties": False
         }
 
     def run(self):
@@ -210,7 +220,7 @@ class Matcher:
             input_data = {
                 "phrase": phrase,
                 "base_lemma": clean_word,
-                "phrase_info": json.dumps(phrase_info, indent=4, ensure_ascii=False),
+                "phrase_info": phrase_info,
                 "definitions": {
                     d['enumerated_lemma']: {
                         "def": d['definition'],
@@ -221,8 +231,7 @@ class Matcher:
             matched_lemma, success = self.match_lemmas(input_data)
             if success:
                 logging.info(f"Matched lemma: {matched_lemma}")
-                response = enumerated_lemma_ops.update_enumerated_lemma(matched_lemma['Matched Lemma'], data={'familiar': True})
-                logging.info(f"Response: {json.dumps(response.json(), indent=4, ensure_ascii=False)}")
+                get_bulk_writer().update(matched_lemma['Matched Lemma'], data={'familiar': True})
             else:
                 logging.error(f"No match found for base lemma '{clean_word}'")
         else:
@@ -1,16 +1,26 @@
 import json
 import logging
-from jsonschema import validate
 from jsonschema.exceptions import ValidationError
 from agents.instruction_translator import InstructionTranslator
 from agents.pydict_translator import PydictTranslator
 from pathlib import Path
-from utils.api_clients import OpenAIClient, AnthropicClient
-import time
+from utils.model_cascade import create_cascade_client
+from utils.batch_clients import create_batch_client, make_batch_request
+from utils.metrics import instrumented, record_retry, record_validation_failure
+from utils.structured_output import parse_structured_output
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s - %(filename)s - %(funcName)s')
 
+SCORE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "score": {"type": "number"}
+    },
+    "required": ["score"],
+    "additionalProperties": False
+}
+
 class POSAgent:
     def __init__(self, language, api_type="anthropic", model="claude-3-haiku-20240307", data_dir="data", translate=False):
         self.api_type = api_type.lower()
@@ -23,7 +33,11 @@ class POSAgent:
             self.language_dir.mkdir(parents=True)
 
         self.model = model
-        self.max_retries = 1
+        # One attempt per model in the cascade: a rejected tag is retried on the advanced model.
+        self.max_retries = self.client.tiers
+        # Output budgets: a POS tag or a similarity score only needs a handful of tokens.
+        self.max_tokens = 64
+        self.score_max_tokens = 32
         self.base_instructions = {
             "instructions": f"You are a helpful assistant that identifies the part of speech of a word in a given phrase in {self.language}."
         }
@@ -42,6 +56,7 @@ class POSAgent:
         self.load_translated_content_keys()
         self.pos_deprel_dict = self.load_pos_deprel_dict()
         self.pos_deprel_terms = self.pos_deprel_dict.keys()
+        self.schema = self.get_validation_schema()
 
         if api_type == "openai":
             self.base_message = {
@@ -55,12 +70,7 @@ class POSAgent:
             self.messages = []
 
     def _create_client(self, model):
-        if self.api_type == "openai":
-            return OpenAIClient(model)
-        elif self.api_type == "anthropic":
-            return AnthropicClient(model)
-        else:
-            raise ValueError(f"Unsupported API type: {self.api_type}")
+        return create_cascade_client(self.api_type, model, agent="POSAgent")
 
     def load_pos_deprel_dict(self):
         try:
@@ -104,12 +114,22 @@ class POSAgent:
             logging.error(f"Error getting validation schema: {e}")
             return None
 
-    def identify_pos(self, word, phrase):
+    def build_identify_pos_messages(self, word, phrase):
         messages = self.messages.copy()
         messages.append({
             "role": "user",
             "content": f"{self.translated_content_keys['part_1']} '{word}' {self.translated_content_keys['part_2']} '{phrase}' {self.translated_content_keys['part_3']}:\n {{'{self.translated_content_keys['part_4']}': '<POS>'}}"
         })
+        return messages
+
+    def parse_pos(self, response_message):
+        if isinstance(response_message, str):
+            response_message = parse_structured_output(response_message, self.schema)
+        return response_message[self.translated_content_keys['part_4']]
+
+    @instrumented("identify_pos")
+    def identify_pos(self, word, phrase):
+        messages = self.build_identify_pos_messages(word, phrase)
         logging.info(f"\n\n ------- Messages: {messages} -------- \n")
         backup_messages = messages.copy()
         
@@ -119,23 +139,47 @@ class POSAgent:
             response_message = ""
             try:
                 if self.api_type == "openai":
-                    response_message = self.client.create_chat_completion(messages, system=None)
+                    response_message = self.client.create_structured_completion(messages, self.schema, system=None, max_tokens=self.max_tokens, name="part_of_speech")
                 else:
-                    response_message = self.client.create_chat_completion(messages, system=self.system_message)
-                try:
-                    logging.info(f"\n\nresponse_message: {response_message}")
-                    #validate(instance=response_message, schema=self.get_validation_schema())
-                    #return response_message[f"{self.translated_content_keys['part_4']}"]
-                    return response_message.split(': ')[1].replace('}', '').replace("'", "")
-                except ValidationError as e:
-                    logging.error(f"Validation error: {e}")
-                    raise e
+                    response_message = self.client.create_structured_completion(messages, self.schema, system=self.system_message, max_tokens=self.max_tokens, name="part_of_speech")
+                logging.info(f"\n\nresponse_message: {response_message}")
+                return self.parse_pos(response_message)
             except Exception as e:
                 retries += 1
                 messages = backup_messages
+                self.client.reject_last_response()
+                if isinstance(e, ValidationError):
+                    record_validation_failure("POSAgent")
+                record_retry("POSAgent")
                 logging.error(f"Error identifying part of speech: {e}")
         return None
 
+    def identify_pos_batch(self, word_phrase_pairs, batch_client=None, timeout=None):
+        """
+        Identify the part of speech of many (word, phrase) pairs in one provider batch job.
+
+        Pairs whose batch result cannot be parsed fall back to `identify_pos`.
+
+        :return: A list of parts of speech aligned with `word_phrase_pairs`.
+        """
+        batch_client = batch_client or create_batch_client(self.api_type, self.model, agent="POSAgent")
+        system = None if self.api_type == "openai" else self.system_message
+        requests = [
+            make_batch_request(f"pos-{index}", self.build_identify_pos_messages(word, phrase), system=system, max_tokens=self.max_tokens, schema=self.schema, name="part_of_speech")
+            for index, (word, phrase) in enumerate(word_phrase_pairs)
+        ]
+        results = batch_client.run(requests, timeout=timeout)
+
+        pos_list = []
+        for request, (word, phrase) in zip(requests, word_phrase_pairs):
+            try:
+                pos_list.append(self.parse_pos(results[request["custom_id"]]))
+            except Exception as e:
+                logging.error(f"Batch POS for '{word}' rejected ({e}), retrying interactively.")
+                batch_client.reject(request)
+                pos_list.append(self.identify_pos(word, phrase))
+        return pos_list
+
     def get_pos_matches(self, base_lemma, pos, enumerated_lemmas, cache=False):
         stored_pos_list = [{lemma["enumerated_lemma"]: str(lemma["part_of_speech"])} for lemma in enumerated_lemmas]
         matched_lemmas = []
@@ -161,10 +205,10 @@ class POSAgent:
                 synonymous = self.check_synonymous_pos(pos, lemma[enumerated_lemma])
                 if synonymous:
                     matched_lemmas.append(enumerated_lemma)
-            time.sleep(0.10)
 
         return matched_lemmas
 
+    @instrumented("check_synonymous_pos")
     def check_synonymous_pos(self, pos1, pos2):
         prompt = f"""Compare the parts of speech '{pos1}' and '{pos2}' in {self.language}:
                     1. Score their similarity from 0 to 1:
@@ -175,25 +219,24 @@ class POSAgent:
         system_message = f"You are a linguistic expert in {self.language}. Your task is to determine how closely related two parts of speech are. " \
             f"Strictly output JSON. No commentary"
         
-        if self.api_type == "openai":
-            messages = [
-                {"role": "system", "content": system_message},
-                {"role": "user", "content": prompt}
-            ]
-            response = self.client.create_chat_completion(messages, system=None)
-        elif self.api_type == "anthropic":
-            messages = [
-                {"role": "user", "content": prompt}
-            ]
-            response = self.client.create_chat_completion(messages, system=system_message)
-            response_value = response.split(': ')[1][:-1]
-            logging.info(f"\n\nresponse_value: {response_value}\n\n")
-
         try:
-            score = float(response_value)
-            return True if score > 0.6 else False  # You can adjust this threshold
-        except (ValueError, KeyError) as e:
-            logging.error(f"Invalid response from AI: {response}")
+            if self.api_type == "openai":
+                messages = [
+                    {"role": "system", "content": system_message},
+                    {"role": "user", "content": prompt}
+                ]
+                response = self.client.create_structured_completion(messages, SCORE_SCHEMA, system=None, max_tokens=self.score_max_tokens, name="similarity")
+            else:
+                messages = [
+                    {"role": "user", "content": prompt}
+                ]
+                response = self.client.create_structured_completion(messages, SCORE_SCHEMA, system=system_message, max_tokens=self.score_max_tokens, name="similarity")
+            logging.info(f"\n\nresponse_value: {response['score']}\n\n")
+            return True if response['score'] > 0.6 else False  # You can adjust this threshold
+        except ValidationError as e:
+            logging.error(f"Invalid response from AI: {e}")
+            self.client.reject_last_response()
+            record_validation_failure("POSAgent")
             return False
     
 
@@ -1,16 +1,15 @@
-import openai
 import json
 import logging
-from jsonschema import validate
 from jsonschema.exceptions import ValidationError
 from pathlib import Path
+from utils.api_clients import OpenAIClient
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s - %(filename)s - %(funcName)s')
 
 class PydictTranslator:
     def __init__(self, language, model="gpt-3.5-turbo-0125"):
-        self.client = openai.OpenAI()
+        self.client = OpenAIClient(model, agent="PydictTranslator")
         self.language = language
         self.model = model
         self.max_retries = 3
@@ -21,13 +20,14 @@ class PydictTranslator:
         }
         self.messages = [self.base_message]
 
-    def get_validation_schema(self):
+    def get_validation_schema(self, key):
         try:
             schema = {
                 "type": "object",
-                "patternProperties": {
-                    ".*": {"type": "string"}
+                "properties": {
+                    key: {"type": "string"}
                 },
+                "required": [key],
                 "additionalProperties": False
             }
             return schema
@@ -52,23 +52,13 @@ class PydictTranslator:
             retries = 0
             while retries < self.max_retries:
                 try:
-                    response = self.client.chat.completions.create(
-                        model=self.model,
-                        messages=messages,
-                        response_format={"type": "json_object"},
-                        temperature=0.0
-                    )
-                    response_message = json.loads(response.choices[0].message.content)
-                    try:
-                        validate(instance=response_message, schema=self.get_validation_schema())
-                        logging.info(f"\n\nresponse_message: {json.dumps(response_message, indent=4)}")
-                        for response_key, translated_value in response_message.items():
-                            self.translated_word_phrase[key] = translated_value
-                        break
-                    except ValidationError as e:
-                        logging.error(f"Validation error: {e}")
-                        raise e
+                    response_message = self.client.create_structured_completion(messages, self.get_validation_schema(key), name="translation")
+                    logging.info(f"\n\nresponse_message: {json.dumps(response_message, indent=4)}")
+                    self.translated_word_phrase[key] = response_message[key]
+                    break
                 except Exception as e:
+                    if isinstance(e, ValidationError):
+                        self.client.reject_last_response()
                     retries += 1
                     messages = backup_messages
                     logging.error(f"Error translating dictionary: {e}")
@@ -1,6 +1,8 @@
 import json
 import logging
-from utils.api_clients import OpenAIClient, AnthropicClient
+from jsonschema.exceptions import ValidationError
+from utils.model_cascade import create_cascade_client
+from utils.metrics import instrumented, record_retry, record_validation_failure
 from pathlib import Path
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s - %(filename)s - %(funcName)s')
@@ -8,12 +10,27 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 advanced_model = "claude-3-5-sonnet-20240620"
 affordable_model = "claude-3-haiku-20240307"
 
+ROOT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "root": {
+            "type": "object",
+            "properties": {
+                "class": {"type": "string"}
+            },
+            "required": ["class"]
+        }
+    },
+    "required": ["root"]
+}
+
 class RootExtractor:
     def __init__(self, api_type="anthropic", model=affordable_model):
         self.api_type = api_type
         self.model = model
         self.client = self._create_client()
         self.max_retries = 3
+        self.max_tokens = 1024
         self.data_dir = Path("data/root_extractor")
         if not Path.exists(self.data_dir):
             Path.mkdir(self.data_dir, parents=True)
@@ -43,13 +60,9 @@ class RootExtractor:
         )
 
     def _create_client(self):
-        if self.api_type.lower() == "openai":
-            return OpenAIClient(self.model)
-        elif self.api_type.lower() == "anthropic":
-            return AnthropicClient(self.model)
-        else:
-            raise ValueError(f"Unsupported API type: {self.api_type}")
+        return create_cascade_client(self.api_type, self.model, agent="RootExtractor")
 
+    @instrumented("extract_root")
     def extract_root(self, class_samples):
         retries = 0
         while retries < self.max_retries:
@@ -60,14 +73,16 @@ class RootExtractor:
                 }
                 
                 if self.api_type == "openai":
-                    response = self.client.create_chat_completion([{"role": "system", "content": self.system_message}, message], system=None)
+                    schema = self.client.create_structured_completion([{"role": "system", "content": self.system_message}, message], ROOT_SCHEMA, system=None, max_tokens=self.max_tokens, name="root_class")
                 else:
-                    response = self.client.create_chat_completion([message], system=self.system_message)
-
-                schema = json.loads(response)
+                    schema = self.client.create_structured_completion([message], ROOT_SCHEMA, system=self.system_message, max_tokens=self.max_tokens, name="root_class")
                 return schema
             except Exception as e:
                 logging.error(f"Error extracting schema: {e}")
+                self.client.reject_last_response()
+                if isinstance(e, ValidationError):
+                    record_validation_failure("RootExtractor")
+                record_retry("RootExtractor")
                 retries += 1
                 if retries == self.max_retries:
                     raise Exception("Max retries reached. Unable to extract schema.")
@@ -1,35 +1,96 @@
+import os
+import sys
 import json
 import csv
+import asyncio
 import logging
+import multiprocessing
 from pathlib import Path
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from jsonschema.exceptions import ValidationError
 
 from utils.general_utils import preprocess_text
 from agents.pos_agent import POSAgent
 from agents.matcher import Matcher
 from agents.definition_extractor import DefinitionExtractor
-from utils.api_clients import OpenAIClient, AnthropicClient
-import lexiwebdb.client.src.operations.enumerated_lemma_ops as enumerated_lemma_ops
+from utils.api_clients import OpenAIClient, AnthropicClient, AsyncOpenAIClient, AsyncAnthropicClient
+from utils.batch_clients import create_batch_client
+from utils.cassette import get_cassette
+from utils.agent_registry import get_agent
+from utils.metrics import get_metrics
+from utils.run_journal import RunJournal
+from utils.definition_utils import get_enumeration
+from utils.bulk_writer import get_bulk_writer
+from utils.http_transport import install_http_transport
+from utils.lemma_cache import get_enumerated_lemmas, get_lemma_cache
+from utils.lemma_backend import get_lemma_ops
+from utils.stanza_batch import DEFAULT_BATCH_SIZE, join_phrases, split_analysis, chunks
 import stanza.client.src.operations.app_ops as stanza_ops
 from stanza.client.src.operations.app_ops import language_abreviations
 from agents.definition_generator import DefinitionGenerator
 from utils.dictionary_loader import DictionaryLoader
 from utils.web_scraping_utils import extract_dictionary_data
 
-advanced_model = "claude-3-5-sonnet-20240620"
-affordable_model = "claude-3-haiku-20240307"
+# Number of LLM/DB round trips kept in flight by the async pipeline.
+DEFAULT_CONCURRENCY = 8
+# Stanza UPOS tags that never become dictionary work items.
+SKIPPED_UPOS = {"PUNCT", "SYM"}
+# UPOS tags whose dictionary part of speech depends on the word (e.g. DET covers both
+# articles and demonstratives), so the POS agent is asked instead. Override with
+# TREELEX_AMBIGUOUS_UPOS, a comma-separated list.
+DEFAULT_AMBIGUOUS_UPOS = ("X", "PART", "DET", "INTJ")
+# Below this Stanza tag confidence, when the service reports one, the POS agent is asked.
+DEFAULT_MIN_POS_CONFIDENCE = 0.9
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(filename)s - %(funcName)s - %(lineno)d - %(message)s')
 
+# PhraseProcessor owned by each worker of a process pool, built once by _init_worker.
+_worker_processor = None
+
+
+def _init_worker(processor_args):
+    global _worker_processor
+    _worker_processor = PhraseProcessor(**processor_args)
+
+
+def _process_item_in_worker(word, phrase, phrase_info, surface=None):
+    return _worker_processor._process_corpus_item(word, phrase, phrase_info, surface)
+
+
 class PhraseProcessor:
-    def __init__(self, language, native_language, api_type="anthropic", model="claude-3-haiku-20240307", data_dir="data"):
+    def __init__(self, language, native_language, api_type="anthropic", model="claude-3-haiku-20240307", data_dir="data", collapse_lemmas=False, journal_path=None):
+        """
+        :param collapse_lemmas: Work on each token's Stanza lemma and UPOS instead of its surface form,
+                                so inflected forms of one lemma are looked up and matched once.
+        :param journal_path: Run journal recording each finished (phrase, word) stage. Stages already
+                             in it are not processed again, so an interrupted run resumes where it stopped.
+        """
         self.language = language
         self.native_language = native_language
         self.api_type = api_type
         self.model = model
         self.data_dir = Path(data_dir)
+        self.processor_args = {
+            "language": language,
+            "native_language": native_language,
+            "api_type": api_type,
+            "model": model,
+            "data_dir": data_dir,
+            "collapse_lemmas": collapse_lemmas,
+            "journal_path": journal_path,
+        }
+        self.journal = RunJournal(journal_path) if journal_path else None
+        self.collapse_lemmas = collapse_lemmas
+        self.ambiguous_upos = set(filter(None, os.environ.get("TREELEX_AMBIGUOUS_UPOS", ",".join(DEFAULT_AMBIGUOUS_UPOS)).split(",")))
+        self.min_pos_confidence = float(os.environ.get("TREELEX_MIN_POS_CONFIDENCE", DEFAULT_MIN_POS_CONFIDENCE))
+        # Activate a TREELEX_CASSETTE before the first Stanza or lexiwebdb request goes out.
+        self.cassette = get_cassette()
+        # Stanza and lexiwebdb requests share one keep-alive connection pool per process.
+        self._install_http_transport()
         
-        self.client = OpenAIClient(model) if api_type.lower() == "openai" else AnthropicClient(model)
-        self.matcher = Matcher(None, language, native_language, api_type, model)
+        self.client = OpenAIClient(model, agent="PhraseProcessor") if api_type.lower() == "openai" else AnthropicClient(model, agent="PhraseProcessor")
+        self.matcher = get_agent(Matcher, list_filepath=None, language=language, native_language=native_language, api_type=api_type, model=model)
         
         self.use_stanza = True
         try:
@@ -41,7 +102,8 @@ class PhraseProcessor:
 
         self.pos_deprel_dict_file = self.phrase_processor_dir / f"{self.language}_pos_deprel_dict.json"
         self.pos_deprel_dict = self.load_or_generate_pos_deprel_dict()
-        self.pos_agent = POSAgent(
+        self.pos_agent = get_agent(
+            POSAgent,
             language=self.language,
             api_type=self.api_type,
             model=model,
@@ -71,9 +133,9 @@ class PhraseProcessor:
             else:
                 self.dictionary = self.dictionary_loader.setup_dictionary(dict_config, self.data_dir)
 
-            self.definition_extractor = DefinitionExtractor()
+            self.definition_extractor = get_agent(DefinitionExtractor)
 
-        self.definition_generator = DefinitionGenerator(self.language, self.native_language)
+        self.definition_generator = get_agent(DefinitionGenerator, language=self.language, native_language=self.native_language)
 
     def set_stanza_language(self):
         stanza_ops.select_language(stanza_ops.language_abreviations[self.language])
@@ -81,6 +143,10 @@ class PhraseProcessor:
     def phrase_analysis(self, phrase):
         return stanza_ops.process_text(phrase)
 
+    def _install_http_transport(self, pool_size=None):
+        # Only the Stanza and lexiwebdb clients get the pooled session; scraping keeps plain requests.
+        install_http_transport(stanza_ops, get_lemma_ops(), pool_size=pool_size)
+
     def load_translated_pos(self):
         try:
             with open(f"{self.data_dir}/translated_pos.json", "r", encoding="utf-8") as f:
@@ -116,100 +182,412 @@ class PhraseProcessor:
 
         return translated_terms
 
+    async def agenerate_pos_deprel_dict(self, concurrency=DEFAULT_CONCURRENCY):
+        stanza_terms = {"pos": [], "deprel": []}
+
+        with open(f'{self.data_dir}/stanza_terms.csv', newline='') as csvfile:
+            reader = csv.DictReader(csvfile)
+            for row in reader:
+                stanza_terms[row['category']].append(row['term'])
+
+        terms = [term for category_terms in stanza_terms.values() for term in category_terms]
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def translate(term):
+            async with semaphore:
+                return await self.aget_translated_term(term)
+
+        translations = await asyncio.gather(*(translate(term) for term in terms))
+        return dict(zip(terms, translations))
+
+    def _term_schema(self, term):
+        return {
+            "type": "object",
+            "properties": {term: {"type": "string"}},
+            "required": [term],
+            "additionalProperties": False
+        }
 
     def get_translated_term(self, term):
         system = f"You are a helpful assistant that translates linguistic terms to {self.language} as would be seen inside of a {self.language} dictionary, and you will strictly output json in accordance with the user's request.."
         if self.api_type.lower() == "anthropic":
-            client = AnthropicClient(self.model)
+            client = AnthropicClient(self.model, agent="PhraseProcessor")
             prompt = f"\n\nTranslate the following linguistic term to {self.language}, output json with key: {term} and value: <translated_term> . Use the full term, no abbreviations. The term is: {term}"
             messages = [{"role": "user", "content": prompt}]
-            translation = client.create_chat_completion(messages=messages, system=system)
         else:
-            client = OpenAIClient(self.model)
+            client = OpenAIClient(self.model, agent="PhraseProcessor")
             prompt = f"\n\nTranslate the following linguistic term to {self.language}, output json with key: {term} and value: <translated_term> . Use the full term, no abbreviations. The term is: {term}"
             messages = [{"role": "user", "content": prompt}]
-            translation = client.create_chat_completion(messages=messages, system=system)
 
         try:
-            translated_json = json.loads(translation)
+            translated_json = client.create_structured_completion(messages, self._term_schema(term), system=system, name="translation")
             return translated_json[term]
-        except (json.JSONDecodeError, KeyError):
+        except ValidationError:
             logging.error(f"Failed to parse response for term: {term}")
+            client.reject_last_response()
             return None
 
 
+    async def aget_translated_term(self, term):
+        system = f"You are a helpful assistant that translates linguistic terms to {self.language} as would be seen inside of a {self.language} dictionary, and you will strictly output json in accordance with the user's request.."
+        prompt = f"\n\nTranslate the following linguistic term to {self.language}, output json with key: {term} and value: <translated_term> . Use the full term, no abbreviations. The term is: {term}"
+        messages = [{"role": "user", "content": prompt}]
+        if self.api_type.lower() == "anthropic":
+            client = AsyncAnthropicClient(self.model, agent="PhraseProcessor")
+        else:
+            client = AsyncOpenAIClient(self.model, agent="PhraseProcessor")
+
+        try:
+            translated_json = await client.create_structured_completion(messages, self._term_schema(term), system=system, name="translation")
+            return translated_json[term]
+        except ValidationError:
+            logging.error(f"Failed to parse response for term: {term}")
+            client.reject_last_response()
+            return None
+
     def get_pos(self, word, phrase):
-        model = advanced_model if len(word) < 4 else affordable_model
-        pos_agent = POSAgent(
-            language=self.language,
-            api_type=self.api_type,
-            model=model,
-            data_dir=str(self.data_dir)
-        )
-        return pos_agent.identify_pos(word, phrase)
+        # The POS agent's model cascade escalates to the advanced model only when a reply is rejected.
+        return self.pos_agent.identify_pos(word, phrase)
 
     def get_enumeration(self, word):
-        response = enumerated_lemma_ops.get_enumerated_lemma_by_base_lemma(word.lower())
-        if response.status_code == 200:
-            enumerated_lemmas = response.json()['enumerated_lemmas']
-            return str(int(enumerated_lemmas[-1]['enumerated_lemma'].split('_')[1]) + 1)
-        logging.info(f"No Base lemma found for word: {word}")
-        return None
+        # Proposed only; the number is reserved when the entry is written.
+        return get_enumeration(word)
 
     def process_phrase(self, phrase):
         phrase_info = self._get_phrase_info(phrase)
-        words = preprocess_text(phrase).split()
         entries = []
 
-        for word in words:
-            logging.info(f"\n------- word: {word} -----\n")
-            try:
-                pos = self._get_part_of_speech(word, phrase, phrase_info)
-                enumerated_lemmas = self._get_enumerated_lemmas(word)
-                #logging.info(f"\n------- enumerated_lemmas: {enumerated_lemmas} -----\n")
-             
-                definitions = self._get_definitions(
-                    word=word, 
-                    phrase=phrase, 
-                    pos=pos, 
-                    phrase_info=phrase_info, 
-                    enumerated_lemmas=enumerated_lemmas, 
-                    definition_generator=self.definition_generator
-                )
-                
-                match = self._match_definitions(word, phrase, phrase_info, definitions)
-                
-                if not match:
-                    new_entry = self._create_new_entry(word, pos, definitions[-1] if definitions else None)
-                    if new_entry:
-                        entries.append(new_entry)
-            except Exception as e:
-                logging.error(f"Error processing word '{word.lower()}': {e}")
-                raise e
+        for word, surface in self._work_items(phrase, phrase_info):
+            new_entry = self._process_word(word, phrase, phrase_info, surface)
+            if new_entry:
+                entries.append(new_entry)
 
         return entries
 
+    async def process_phrases(self, phrases, concurrency=DEFAULT_CONCURRENCY):
+        """
+        Process many phrases concurrently, keeping at most `concurrency` words in flight.
+
+        :param phrases: Iterable of phrases.
+        :param concurrency: Maximum number of concurrent Stanza/word stages.
+        :return: One list of new entries per phrase, in input order.
+        """
+        self._install_http_transport(pool_size=concurrency)
+        loop = asyncio.get_running_loop()
+        semaphore = asyncio.Semaphore(concurrency)
+        executor = ThreadPoolExecutor(max_workers=concurrency)
+
+        async def run_limited(func, *args):
+            async with semaphore:
+                return await loop.run_in_executor(executor, func, *args)
+
+        phrases = list(phrases)
+        phrase_infos = await loop.run_in_executor(executor, self._get_phrase_infos, phrases)
+        await loop.run_in_executor(executor, self._prefetch_lemmas, phrases, phrase_infos)
+
+        async def process(phrase, phrase_info):
+            items = self._work_items(phrase, phrase_info)
+            results = await asyncio.gather(*(run_limited(self._process_word, word, phrase, phrase_info, surface) for word, surface in items))
+            return [entry for entry in results if entry]
+
+        try:
+            return await asyncio.gather(*(process(phrase, phrase_info) for phrase, phrase_info in zip(phrases, phrase_infos)))
+        finally:
+            executor.shutdown(wait=False)
+
+    def iter_process_phrases(self, phrases, workers=DEFAULT_CONCURRENCY, max_pending=None, batch_size=DEFAULT_BATCH_SIZE):
+        """
+        Process phrases and yield one result per word as soon as that word finishes.
+
+        `phrases` is read lazily, `batch_size` phrases per Stanza request, and at most
+        `max_pending` words are queued or running at a time: while the caller is not
+        consuming results, no new work is started. Results therefore arrive in completion
+        order, not input order.
+
+        :param phrases: Iterable of phrases, e.g. an open file.
+        :param workers: Words processed concurrently.
+        :param max_pending: Bound on words in flight plus finished but not yet yielded. Defaults to 2 * workers.
+        :return: Generator of dicts with `phrase`, `word`, `surface`, `status` ("matched", "new",
+                 "unresolved" or "failed"), `matched_lemma`, `entry` and `error`.
+        """
+        max_pending = max_pending or 2 * workers
+        self._install_http_transport(pool_size=workers)
+        pool = ThreadPoolExecutor(max_workers=workers)
+        pending = set()
+        try:
+            for item in self._iter_work_items(phrases, batch_size):
+                while len(pending) >= max_pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield future.result()
+                pending.add(pool.submit(self._word_result, *item))
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        finally:
+            # Also reached when the caller stops iterating early.
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    def _iter_work_items(self, phrases, batch_size):
+        phrases = (phrase.strip() for phrase in phrases)
+        phrases = (phrase for phrase in phrases if phrase)
+        while True:
+            batch = list(islice(phrases, batch_size))
+            if not batch:
+                return
+            phrase_infos = self._get_phrase_infos(batch, batch_size)
+            self._prefetch_lemmas(batch, phrase_infos)
+            for phrase, phrase_info in zip(batch, phrase_infos):
+                for word, surface in self._work_items(phrase, phrase_info):
+                    yield word, phrase, phrase_info, surface
+
+    def _prefetch_lemmas(self, phrases, phrase_infos):
+        """Load the senses of every word the phrases will look up into the lemma cache in a few round trips."""
+        words = [word for phrase, phrase_info in zip(phrases, phrase_infos) for word, _ in self._work_items(phrase, phrase_info)]
+        get_lemma_cache().prefetch(words)
+
+    def _word_result(self, word, phrase, phrase_info, surface):
+        result = {"phrase": phrase, "word": word, "surface": surface, "status": "unresolved", "matched_lemma": None, "entry": None, "error": None}
+        try:
+            outcome = self._resolve_word(word, phrase, phrase_info, surface)
+        except Exception as e:
+            result.update(status="failed", error=str(e))
+            return result
+        if outcome["matched_lemma"]:
+            result.update(status="matched", matched_lemma=outcome["matched_lemma"])
+        elif outcome["entry"]:
+            result.update(status="new", entry=outcome["entry"])
+        return result
+
+    def process_corpus(self, path, workers=DEFAULT_CONCURRENCY, executor="thread", output_path=None):
+        """
+        Run every phrase of a corpus file through the pipeline, processing each work item once.
+
+        Words are keyed on the lowercased word and its Stanza POS. With `collapse_lemmas` the
+        work item is the lemma and the key is the Stanza lemma and POS, so all inflections of a
+        lemma share one item. Each key is processed for its first occurrence only and its
+        entries are reported with that phrase; later occurrences are not processed again and
+        report no entries of their own.
+
+        :param path: Text file with one phrase per line.
+        :param workers: Size of the worker pool.
+        :param executor: "thread", or "process" to run word stages in separate, spawned processes.
+        :param output_path: JSONL file with one {"phrase", "entries"} record per phrase, in input order.
+                            Defaults to data/phrase_processor/<corpus name>_entries.jsonl.
+        :return: One list of new entries per phrase, in input order.
+        """
+        path = Path(path)
+        with open(path, "r", encoding="utf-8") as f:
+            phrases = [line.strip() for line in f if line.strip()]
+        output_path = Path(output_path) if output_path else self.phrase_processor_dir / f"{path.stem}_entries.jsonl"
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        self._install_http_transport(pool_size=workers)
+
+        phrase_infos = self._get_phrase_infos(phrases)
+
+        items = {}
+        owned_items = []
+        for phrase, phrase_info in zip(phrases, phrase_infos):
+            owned = []
+            for word, surface in self._work_items(phrase, phrase_info):
+                key = self._item_key(word, surface, phrase_info)
+                if key not in items:
+                    items[key] = (word, phrase, phrase_info, surface)
+                    owned.append(key)
+            owned_items.append(owned)
+        logging.info(f"{len(phrases)} phrases, {sum(len(preprocess_text(phrase).split()) for phrase in phrases)} words, {len(items)} unique work items")
+        # Process-pool workers have their own lemma cache unless TREELEX_LEMMA_CACHE shares it on disk.
+        get_lemma_cache().prefetch(word for word, _, _, _ in items.values())
+
+        if executor == "process":
+            # Spawned, not forked: a forked worker would inherit this process's SQLite connections
+            # and the registry's agents together with their SDK clients and connection pools.
+            pool = ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker, initargs=(self.processor_args,)
+            )
+            submit = lambda item: pool.submit(_process_item_in_worker, *item)
+        elif executor == "thread":
+            pool = ThreadPoolExecutor(max_workers=workers)
+            submit = lambda item: pool.submit(self._process_corpus_item, *item)
+        else:
+            raise ValueError(f"Unsupported executor: {executor}")
+
+        results = []
+        with pool, open(output_path, "w", encoding="utf-8") as out:
+            futures = {key: submit(item) for key, item in items.items()}
+            # Written as each phrase's own items finish, so the file stays in input order.
+            for phrase, owned in zip(phrases, owned_items):
+                entries = []
+                for key in owned:
+                    entry = futures[key].result()
+                    if entry:
+                        entries.append(entry)
+                out.write(json.dumps({"phrase": phrase, "entries": entries}, ensure_ascii=False) + "\n")
+                results.append(entries)
+        logging.info(f"Wrote {sum(len(entries) for entries in results)} new entries to {output_path}")
+        return results
+
+    def _process_corpus_item(self, word, phrase, phrase_info, surface=None):
+        try:
+            return self._process_word(word, phrase, phrase_info, surface)
+        except Exception as e:
+            logging.error(f"Skipping '{word}' in corpus run: {e}")
+            return None
+
+    def _find_token(self, word, phrase_info):
+        for sentence in phrase_info or []:
+            for token in sentence.get("tokens", []):
+                if token.get("text", "").lower() == word.lower():
+                    return token
+        return None
+
+    def _lemma_key(self, word, phrase_info):
+        token = self._find_token(word, phrase_info)
+        if token:
+            return token.get("lemma", word).lower(), token.get("pos")
+        return word.lower(), None
+
+    def _item_key(self, word, surface, phrase_info):
+        """The corpus deduplication key of a work item: its lemma when lemmas are collapsed, else the word itself."""
+        lemma, pos = self._lemma_key(surface, phrase_info)
+        if self.collapse_lemmas:
+            return lemma, pos
+        return word.lower(), pos
+
+    def _work_items(self, phrase, phrase_info):
+        """
+        The (word, surface form) pairs to process for a phrase.
+
+        Without `collapse_lemmas`, or without a Stanza analysis, every word of the phrase is
+        its own item. With it, each token is replaced by its lemma and tokens sharing a
+        (lemma, UPOS) pair collapse into one item; the first surface form is kept as context.
+        """
+        if not (self.collapse_lemmas and phrase_info):
+            return [(word, word) for word in preprocess_text(phrase).split()]
+        items = []
+        seen = set()
+        for sentence in phrase_info:
+            for token in sentence.get("tokens", []):
+                surface = token.get("text", "")
+                if token.get("pos") in SKIPPED_UPOS or not preprocess_text(surface).strip():
+                    continue
+                lemma = token.get("lemma") or surface
+                if (lemma.lower(), token.get("pos")) not in seen:
+                    seen.add((lemma.lower(), token.get("pos")))
+                    items.append((lemma, surface))
+        return items
+
+    def generate_definitions_batch(self, phrases, timeout=None, **batch_options):
+        """
+        Offline bulk mode: identify POS and generate definitions for every unknown word
+        in `phrases` through provider batch jobs instead of one call per word.
+
+        :param phrases: Iterable of phrases.
+        :param timeout: Seconds to wait for each batch job.
+        :param batch_options: Passed to the batch clients, e.g. `base_url` or `poll_interval`.
+        :return: The new entries added to the database.
+        """
+        phrases = list(phrases)
+        work = []
+        for phrase, phrase_info in zip(phrases, self._get_phrase_infos(phrases)):
+            for word, surface in self._work_items(phrase, phrase_info):
+                work.append((word, phrase, phrase_info, surface))
+        get_lemma_cache().prefetch(word for word, _, _, _ in work)
+
+        # Only words Stanza cannot tag unambiguously go into the POS batch.
+        pos_list = [self._get_stanza_pos(surface, phrase_info) for _, _, phrase_info, surface in work]
+        unresolved = [index for index, pos in enumerate(pos_list) if not pos]
+        if unresolved:
+            pos_client = create_batch_client(self.api_type, self.pos_agent.model, agent="POSAgent", **batch_options)
+            batch_pos = self.pos_agent.identify_pos_batch([(work[index][3], work[index][1]) for index in unresolved], batch_client=pos_client, timeout=timeout)
+            for index, pos in zip(unresolved, batch_pos):
+                pos_list[index] = pos
+
+        items = []
+        seen = set()
+        for (word, phrase, phrase_info, surface), pos in zip(work, pos_list):
+            if word.lower() in seen or self._get_enumerated_lemmas(word):
+                continue
+            seen.add(word.lower())
+            items.append({"word": word.lower(), "phrase": phrase, "pos": pos, "phrase_info": phrase_info})
+
+        definition_client = create_batch_client(self.api_type, self.definition_generator.model, agent="DefinitionGenerator", **batch_options)
+        return self.definition_generator.run_batch(items, batch_client=definition_client, timeout=timeout)
+
+    def _process_word(self, word, phrase, phrase_info, surface=None):
+        """
+        :param word: The base lemma looked up and matched.
+        :param surface: The form `word` takes in `phrase`, if it differs.
+        :return: The new entry, or None when the word matched an existing lemma.
+        """
+        return self._resolve_word(word, phrase, phrase_info, surface)["entry"]
+
+    def _resolve_word(self, word, phrase, phrase_info, surface=None):
+        """
+        :return: {"matched_lemma": ..., "entry": ...}; at most one of them is set.
+        """
+        logging.info(f"\n------- word: {word} -----\n")
+        if self.journal and self.journal.done(phrase, word):
+            logging.info(f"'{word}' in '{phrase}' already finished, taking its result from the journal")
+            return self.journal.result(phrase, word)
+        surface = surface or word
+        try:
+            pos = self._get_part_of_speech(surface, phrase, phrase_info)
+            enumerated_lemmas = self._get_enumerated_lemmas(word)
+            #logging.info(f"\n------- enumerated_lemmas: {enumerated_lemmas} -----\n")
+         
+            definitions = self._get_definitions(
+                word=word, 
+                phrase=phrase, 
+                pos=pos, 
+                phrase_info=phrase_info, 
+                enumerated_lemmas=enumerated_lemmas, 
+                definition_generator=self.definition_generator
+            )
+            
+            match, settled = self._match_definitions(word, phrase, phrase_info, definitions, surface)
+            
+            outcome = {
+                "matched_lemma": match.get("Matched Lemma") if match else None,
+                "entry": None if match else self._create_new_entry(word, pos, definitions[-1] if definitions else None)
+            }
+            if self.journal and settled:
+                self.journal.record(phrase, word, outcome)
+            elif self.journal:
+                # A matcher that gave up on errors is no verdict; a resumed run tries the word again.
+                logging.warning(f"Matching '{word}' in '{phrase}' failed, not journaling its outcome")
+            return outcome
+        except Exception as e:
+            logging.error(f"Error processing word '{word.lower()}': {e}")
+            raise e
+
     def _get_definitions(self,*, word:str, phrase:str, pos:str, phrase_info:dict, enumerated_lemmas:list, definition_generator:DefinitionGenerator):
         definitions = []
         if enumerated_lemmas:
             return enumerated_lemmas
         
         if not definitions:
-            new_definition = definition_generator.generate_definition(word.lower(), phrase, pos, phrase_info)
+            new_definition = self._generate_new_definition(word, phrase, pos, phrase_info, definition_generator)
             if new_definition:
                 definitions.append({
-                    "enumerated_lemma": word + '_' + self.get_enumeration(word),
-                    "definition": new_definition,
-                    "part_of_speech": pos
+                    "enumerated_lemma": new_definition["enumeration"],
+                    "definition": new_definition["definition"],
+                    "part_of_speech": new_definition["part_of_speech"]
                 })
         
         return definitions
 
-    def _match_definitions(self, word, phrase, phrase_info, definitions):
+    def _match_definitions(self, word, phrase, phrase_info, definitions, surface=None):
+        """
+        :return: (match or None, settled). `settled` is False when the matcher gave up on errors
+                 rather than rejecting every definition, so the missing match is not a verdict.
+        """
         if not definitions:
-            return None
+            return None, True
 
-        match, success = self.matcher.match_lemmas({
+        input_data = {
             "phrase": phrase,
             "base_lemma": word.lower(),
             "phrase_info": phrase_info if self.use_stanza else None,
@@ -219,13 +597,16 @@ class PhraseProcessor:
                     "pos": lemma['part_of_speech']
                 } for lemma in definitions
             }
-        })
-        self.matcher.messages = []
+        }
+        if surface and surface.lower() != word.lower():
+            input_data["surface_form"] = surface
+        match, success = self.matcher.match_lemmas(input_data)
         
         if match:
             logging.info(f"\n\nmatch: {match}\n\n")
-            return match
-        return None
+            return match, success
+        # The matcher drops each definition its reviewer rejects.
+        return None, not input_data["definitions"]
 
     def _create_new_entry(self, word, pos, definition):
         if definition:
@@ -240,7 +621,11 @@ class PhraseProcessor:
 
     def _get_phrase_info(self, phrase):
         if self.use_stanza:
-            response = self.phrase_analysis(phrase)
+            try:
+                response = self.phrase_analysis(phrase)
+            except Exception as e:
+                logging.error(f"Stanza analysis of '{phrase}' failed: {e}")
+                return None
             if response.status_code == 200:
                 phrase_info = response.json()
             else:
@@ -249,29 +634,75 @@ class PhraseProcessor:
             phrase_info = None
         return phrase_info
 
+    def _get_phrase_infos(self, phrases, batch_size=DEFAULT_BATCH_SIZE):
+        """
+        Analyse `phrases` with one Stanza request per `batch_size` phrases.
+
+        The phrases of a batch are sent as blank-line separated paragraphs and the returned
+        sentences are split back per phrase. A batch that fails or cannot be split is
+        analysed phrase by phrase instead, and a phrase whose request fails gets no analysis.
+
+        :return: One phrase_info per phrase, in input order.
+        """
+        if not self.use_stanza:
+            return [None] * len(phrases)
+        phrase_infos = []
+        for batch in chunks(phrases, batch_size):
+            document, spans = join_phrases(batch)
+            try:
+                response = self.phrase_analysis(document)
+                per_phrase = split_analysis(document, spans, response.json()) if response.status_code == 200 else None
+            except Exception as e:
+                # Connection errors and read timeouts fall back like an error status.
+                logging.error(f"Batched Stanza request failed: {e}")
+                per_phrase = None
+            if per_phrase is None:
+                logging.warning(f"Batched Stanza analysis failed, analysing {len(batch)} phrases one by one")
+                phrase_infos.extend(self._get_phrase_info(phrase) for phrase in batch)
+            else:
+                phrase_infos.extend(sentences or None for sentences in per_phrase)
+        logging.info(f"Analysed {len(phrases)} phrases in {-(-len(phrases) // batch_size)} Stanza requests")
+        return phrase_infos
+
     def _get_part_of_speech(self, word, phrase, phrase_info):
-        pos = self.get_pos(word, phrase)
-        if not pos and phrase_info:
-            pos = self._get_pos_from_phrase_info(word, phrase_info)
+        pos = self._get_stanza_pos(word, phrase_info)
+        if not pos:
+            pos = self.get_pos(word, phrase)
         logging.info(f"\n------- pos: {pos} -----\n")
         return pos
 
+    def _get_stanza_pos(self, word, phrase_info):
+        """
+        The part of speech Stanza assigned to `word`, in the dictionary's terms.
+
+        :return: None when the POS agent should decide: no analysis, a tag in `ambiguous_upos`,
+                 a confidence below `min_pos_confidence`, or no translation for the tag.
+        """
+        token = self._find_token(word, phrase_info)
+        if token is None or token.get("pos") in self.ambiguous_upos:
+            return None
+        confidence = token.get("confidence")
+        if confidence is not None and confidence < self.min_pos_confidence:
+            return None
+        pos = self._get_pos_from_phrase_info(word, phrase_info)
+        if pos:
+            get_metrics().inc("treelex_pos_llm_calls_avoided_total", language=self.language)
+        return pos
+
     def _get_pos_from_phrase_info(self, word, phrase_info):
-        for _, value in phrase_info:
-            for token in value:
-                if token['text'] == word:
-                    return self.pos_deprel_dict[token['pos']]
-        return None
+        token = self._find_token(word, phrase_info)
+        if token is None:
+            return None
+        return (self.pos_deprel_dict or {}).get(token.get("pos"))
 
     def _get_enumerated_lemmas(self, word):
-        response = enumerated_lemma_ops.get_enumerated_lemma_by_base_lemma(word.lower())
-        if response.status_code == 200:
-            return response.json()['enumerated_lemmas']
-        elif self.online_dictionary:
+        enumerated_lemmas = get_enumerated_lemmas(word)
+        if enumerated_lemmas is None and self.online_dictionary:
             self._fetch_online_dictionary_data(word)
-            response = enumerated_lemma_ops.get_enumerated_lemma_by_base_lemma(word.lower())
-            return response.json()['enumerated_lemmas'] if response.status_code == 200 else None
-        return None
+            # The extracted definitions are queued; writing them also invalidates the cached miss.
+            get_bulk_writer().flush()
+            enumerated_lemmas = get_enumerated_lemmas(word)
+        return enumerated_lemmas
 
     def _fetch_online_dictionary_data(self, word):
         url = self.dictionary.get_url(word.lower())
@@ -304,15 +735,9 @@ class PhraseProcessor:
         return None  # No match found, will generate new definition
 
     def _generate_new_definition(self, word, phrase, pos, phrase_info, definition_generator):
-        definition = definition_generator.generate_definition(word.lower(), phrase, pos, phrase_info)
-        if definition:
-            return {
-                "enumeration": word + '_' + self.get_enumeration(word) if self.get_enumeration(word) else word + '_1',
-                "base_lemma": word,
-                "part_of_speech": pos,
-                "definition": definition
-            }
-        return None
+        entries = []
+        definition_generator.generate_definition_for_word(word=word.lower(), phrase=phrase, pos=pos, phrase_info=phrase_info, entries=entries)
+        return entries[0] if entries else None
 
 
 if __name__ == "__main__":
@@ -334,6 +759,14 @@ if __name__ == "__main__":
             "root": "data/szotudastar/szotudastar_dictionary_root.json"
         }
     }
-    phrase_processor = PhraseProcessor("Hungarian", "English")
+    # Usage: python phrase_processor.py <phrase_list> [workers] [thread|process] [lemmas]
+    # A corpus run journals to data/phrase_processor/<corpus name>_journal.jsonl; rerun the same command to resume.
+    journal_path = Path("data/phrase_processor") / f"{Path(sys.argv[1]).stem}_journal.jsonl" if len(sys.argv) > 1 else None
+    phrase_processor = PhraseProcessor("Hungarian", "English", collapse_lemmas=len(sys.argv) > 4 and sys.argv[4] == "lemmas", journal_path=journal_path)
     print(phrase_processor.online_dictionary)
-    phrase_processor.process_phrase("A macska szép.")
\ No newline at end of file
+    if len(sys.argv) > 1:
+        workers = int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_CONCURRENCY
+        executor = sys.argv[3] if len(sys.argv) > 3 else "thread"
+        phrase_processor.process_corpus(sys.argv[1], workers=workers, executor=executor)
+    else:
+        phrase_processor.process_phrase("A macska szép.")
\ No newline at end of file
@@ -0,0 +1,70 @@
+import pytest
+
+pytest.importorskip("jsonschema")
+pytest.importorskip("lexiwebdb.client.src.operations.enumerated_lemma_ops")
+pytest.importorskip("stanza.client.src.operations.app_ops")
+
+import agents.definition_generator as definition_generator_module
+from agents.definition_checker import DefinitionChecker
+from agents.definition_generator import DefinitionGenerator
+from phrase_processor import PhraseProcessor
+
+
+class FakeClient:
+    tiers = 1
+
+    def __init__(self, reply):
+        self.reply = reply
+        self.calls = []
+
+    def create_structured_completion(self, messages, schema, system=None, max_tokens=None, name=None):
+        self.calls.append(messages)
+        return self.reply
+
+    def reject_last_response(self):
+        pass
+
+
+class FakeChecker:
+    def check_definition(self, word, definition, language):
+        return True
+
+
+class RejectingMatcher:
+    def match_lemmas(self, input_data):
+        input_data["definitions"].clear()
+        return None, False
+
+
+@pytest.fixture
+def definition_generator(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    client = FakeClient({"word": "kutya", "def": "Négylábú háziállat."})
+    monkeypatch.setattr(definition_generator_module, "create_cascade_client", lambda *args, **kwargs: client)
+    monkeypatch.setattr(
+        definition_generator_module, "get_agent",
+        lambda cls, **kwargs: FakeChecker() if cls is DefinitionChecker else None
+    )
+    monkeypatch.setattr(definition_generator_module, "get_enumeration", lambda word: "1")
+    return DefinitionGenerator(language="Hungarian", native_language="English")
+
+
+def test_unknown_word_gets_a_generated_entry(definition_generator):
+    processor = PhraseProcessor.__new__(PhraseProcessor)
+    processor.journal = None
+    processor.use_stanza = False
+    processor.matcher = RejectingMatcher()
+    processor.definition_generator = definition_generator
+    processor._get_part_of_speech = lambda word, phrase, phrase_info: "főnév"
+    processor._get_enumerated_lemmas = lambda word: None
+
+    outcome = processor._resolve_word("kutya", "A kutya ugat.", None)
+
+    assert outcome["matched_lemma"] is None
+    assert outcome["entry"] == {
+        "enumeration": "kutya_1",
+        "base_lemma": "kutya",
+        "part_of_speech": "főnév",
+        "definition": "Négylábú háziállat."
+    }
+    assert len(definition_generator.client.calls) == 1
@@ -0,0 +1,71 @@
+import os
+import logging
+import threading
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s - %(filename)s - %(funcName)s')
+
+_transports = {}
+_transports_lock = threading.Lock()
+_agents = {}
+# Re-entrant: building an agent can build the agents it delegates to (Matcher -> MatchReviewer).
+_agents_lock = threading.RLock()
+
+
+def _build_transport(provider, asynchronous, base_url):
+    kwargs = {"base_url": base_url} if base_url else {}
+    if provider == "openai":
+        import openai
+        return openai.AsyncOpenAI(**kwargs) if asynchronous else openai.OpenAI(**kwargs)
+    if provider == "anthropic":
+        import anthropic
+        return anthropic.AsyncAnthropic(**kwargs) if asynchronous else anthropic.Anthropic(**kwargs)
+    raise ValueError(f"Unsupported API type: {provider}")
+
+
+def get_transport(provider, asynchronous=False, base_url=None):
+    """
+    Return the process-wide SDK client for a provider, creating it on first use.
+
+    Every APIClient and BatchClient of the provider shares its connection pool, so
+    connections and TLS sessions are reused across agents and models. Worker processes
+    build their own, as an SDK client must not be shared across a fork.
+    """
+    key = (provider.lower(), asynchronous, base_url, os.getpid())
+    with _transports_lock:
+        if key not in _transports:
+            _transports[key] = _build_transport(provider.lower(), asynchronous, base_url)
+        return _transports[key]
+
+
+def _agent_key(agent_class, kwargs):
+    return (agent_class.__name__,) + tuple(sorted(kwargs.items()))
+
+
+def get_agent(agent_class, **kwargs):
+    """
+    Return the process-wide instance of `agent_class` for these constructor arguments.
+
+    Agents are keyed by their type and keyword arguments (language, api_type, model, ...),
+    so every caller asking for the same configuration gets the same instance instead of
+    re-reading its prompt files and creating new clients.
+
+    :param agent_class: An agent class, e.g. POSAgent.
+    :param kwargs: Keyword arguments for the constructor. Values must be hashable.
+    """
+    key = _agent_key(agent_class, kwargs)
+    agent = _agents.get(key)
+    if agent is None:
+        with _agents_lock:
+            agent = _agents.get(key)
+            if agent is None:
+                logging.info(f"Building shared {agent_class.__name__} for {kwargs}")
+                agent = _agents[key] = agent_class(**kwargs)
+    return agent
+
+
+def clear_registry():
+    """Drop every shared agent and transport, e.g. after changing prompt files."""
+    with _agents_lock:
+        _agents.clear()
+    with _transports_lock:
+        _transports.clear()
@@ -1,43 +1,372 @@
 import json
+import time
+import hashlib
+import logging
+import threading
 from abc import ABC, abstractmethod
 import openai
 import anthropic
-import time
+from utils.rate_limiter import get_rate_limiter, estimate_tokens
+from utils.llm_cache import LLMCache, get_default_cache
+from utils.single_flight import get_single_flight
+from utils.metrics import get_metrics
+from utils.cassette import get_cassette
+from utils.agent_registry import get_transport
+from utils.structured_output import parse_structured_output, anthropic_tool, openai_response_format, tool_use_json
+
+# How many times a 429 is retried after the SDK's own retries are exhausted.
+RATE_LIMIT_RETRIES = 3
+
+USAGE_COUNTERS = {
+    "input_tokens": "treelex_llm_input_tokens_total",
+    "output_tokens": "treelex_llm_output_tokens_total",
+    "cached_tokens": "treelex_llm_cached_tokens_total",
+    "cache_write_tokens": "treelex_llm_cache_write_tokens_total",
+}
+
+def record_usage(agent, model, input_tokens=0, output_tokens=0, cached_tokens=0, cache_write_tokens=0):
+    usage = {
+        "input_tokens": input_tokens,
+        "output_tokens": output_tokens,
+        "cached_tokens": cached_tokens,
+        "cache_write_tokens": cache_write_tokens,
+    }
+    for field, name in USAGE_COUNTERS.items():
+        get_metrics().inc(name, usage[field] or 0, agent=agent or "unknown", model=model)
 
-SLEEP_TIME = 1
+def get_usage_stats():
+    """Token usage per agent, including prompt tokens served from the provider's prompt cache."""
+    stats = {}
+    names = {name: field for field, name in USAGE_COUNTERS.items()}
+    for counter in get_metrics().to_json()["counters"]:
+        if counter["name"] in names:
+            agent_stats = stats.setdefault(counter["labels"].get("agent"), dict.fromkeys(USAGE_COUNTERS, 0))
+            agent_stats[names[counter["name"]]] += counter["value"]
+    return stats
 
 class APIClient(ABC):
+    def __init__(self, model, agent=None, cache=None, prompt_caching=False):
+        self.model = model
+        self.agent = agent
+        self.cache = cache if cache is not None else get_default_cache()
+        # Mark the static system prompt as a reusable prefix on the provider side.
+        self.prompt_caching = prompt_caching
+        self._local = threading.local()
+
+    def create_chat_completion(self, messages, system=None, temperature=0.0, max_tokens=4096):
+        key = self._request_key(messages, system, temperature, max_tokens)
+        return self._serve(key, lambda: self._create_chat_completion(messages, system, temperature, max_tokens))
+
+    def create_structured_completion(self, messages, schema, system=None, temperature=0.0, max_tokens=4096, name="respond"):
+        """
+        Ask for a reply that conforms to `schema` through the provider's structured output
+        (Anthropic tool use, OpenAI JSON schema) and validate it against the precompiled schema.
+
+        :param schema: JSON schema of the reply object.
+        :param name: Name of the tool / response format shown to the model.
+        :return: The reply as a dict.
+        :raises ValidationError: If the reply is not JSON or does not match `schema`.
+        """
+        key = self._request_key(messages, system, temperature, max_tokens, schema=schema)
+        content = self._serve(key, lambda: self._create_structured_completion(messages, system, temperature, max_tokens, schema, name))
+        return parse_structured_output(content, schema)
+
+    def _serve(self, key, complete):
+        cassette = get_cassette()
+        if cassette is not None and cassette.replaying:
+            return cassette.replay("llm", key)
+
+        def timed_complete():
+            with get_metrics().timer("treelex_llm_request_seconds", agent=self.agent, model=self.model):
+                content = complete()
+            if self.cache:
+                self.cache.put(key, content, model=self.model)
+            return content
+
+        started = time.perf_counter()
+        content = self._get_cached(key)
+        if content is None:
+            # Identical requests already in flight on another thread share that call's reply.
+            content = get_single_flight().do(key, timed_complete)
+        if cassette is not None:
+            cassette.record("llm", key, content, time.perf_counter() - started, model=self.model, agent=self.agent)
+        return content
+
+    @abstractmethod
+    def _create_chat_completion(self, messages, system, temperature, max_tokens):
+        pass
+
     @abstractmethod
-    def create_chat_completion(self, messages, temperature=0.0):
+    def _create_structured_completion(self, messages, system, temperature, max_tokens, schema, name):
         pass
 
+    def reject_last_response(self):
+        """Drop the reply last returned on this thread from the cache, e.g. after it failed validation."""
+        key = getattr(self._local, "last_key", None)
+        if key and self.cache:
+            self.cache.delete(key)
+        self._local.last_key = None
+
+    def _get_cached(self, key):
+        if not self.cache:
+            return None
+        cached = self.cache.get(key, agent=self.agent)
+        name = "treelex_llm_cache_hits_total" if cached is not None else "treelex_llm_cache_misses_total"
+        get_metrics().inc(name, agent=self.agent)
+        return cached
+
+    def _request_key(self, messages, system, temperature, max_tokens, **extra):
+        key = LLMCache.make_key(self.model, system, messages, temperature, max_tokens, **extra)
+        self._local.last_key = key
+        return key
+
+    def _handle_rate_limit(self, error, attempt):
+        if attempt >= RATE_LIMIT_RETRIES:
+            raise error
+        headers = getattr(getattr(error, "response", None), "headers", None)
+        self.rate_limiter.update_from_headers(headers)
+        if not headers or "retry-after" not in headers:
+            self.rate_limiter.back_off(2 ** attempt)
+        logging.warning(f"Rate limited by provider, retrying ({attempt + 1}/{RATE_LIMIT_RETRIES})")
+
+    def _anthropic_system(self, system):
+        if system is None:
+            return anthropic.NOT_GIVEN
+        if not self.prompt_caching:
+            return system
+        return [{"type": "text", "text": system, "cache_control": {"type": "ephemeral"}}]
+
+    def _openai_extra_body(self, messages):
+        # OpenAI caches long prompt prefixes automatically; a stable cache key keeps
+        # requests sharing the same system prompt routed to the same cache.
+        if not self.prompt_caching or not messages or messages[0].get("role") != "system":
+            return None
+        prefix = json.dumps(messages[0], sort_keys=True, ensure_ascii=False)
+        return {"prompt_cache_key": f"{self.agent}-{hashlib.sha256(prefix.encode('utf-8')).hexdigest()[:16]}"}
+
+    def _record_openai_usage(self, usage):
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached_tokens = getattr(details, "cached_tokens", 0) if details else 0
+        record_usage(self.agent, self.model, usage.prompt_tokens, usage.completion_tokens, cached_tokens)
+
+    def _record_anthropic_usage(self, usage):
+        record_usage(
+            self.agent,
+            self.model,
+            usage.input_tokens,
+            usage.output_tokens,
+            getattr(usage, "cache_read_input_tokens", 0),
+            getattr(usage, "cache_creation_input_tokens", 0)
+        )
+
 class OpenAIClient(APIClient):
-    def __init__(self, model):
-        self.client = openai.OpenAI()
-        self.model = model
+    def __init__(self, model, agent=None, cache=None, prompt_caching=False):
+        super().__init__(model, agent=agent, cache=cache, prompt_caching=prompt_caching)
+        self.client = get_transport("openai")
+        self.rate_limiter = get_rate_limiter("openai")
 
-    def create_chat_completion(self, messages, system=None, temperature=0.0, max_tokens=4096):
-        response = self.client.chat.completions.create(
-            model=self.model,
+    def _request(self, estimated_tokens, **params):
+        attempt = 0
+        while True:
+            self.rate_limiter.acquire(estimated_tokens)
+            try:
+                raw_response = self.client.chat.completions.with_raw_response.create(model=self.model, **params)
+                break
+            except openai.RateLimitError as e:
+                self._handle_rate_limit(e, attempt)
+                attempt += 1
+        self.rate_limiter.update_from_headers(raw_response.headers)
+        response = raw_response.parse()
+        self.rate_limiter.reconcile(estimated_tokens, response.usage.total_tokens)
+        self._record_openai_usage(response.usage)
+        return response
+
+    def _create_chat_completion(self, messages, system, temperature, max_tokens):
+        response = self._request(
+            estimate_tokens(messages),
             messages=messages,
             response_format={"type": "json_object"},
             max_tokens=max_tokens,
-            temperature=temperature
+            temperature=temperature,
+            extra_body=self._openai_extra_body(messages)
         )
         return response.choices[0].message.content
 
+    def _create_structured_completion(self, messages, system, temperature, max_tokens, schema, name):
+        response = self._request(
+            estimate_tokens(messages),
+            messages=messages,
+            response_format=openai_response_format(schema, name),
+            max_tokens=max_tokens,
+            temperature=temperature,
+            extra_body=self._openai_extra_body(messages)
+        )
+        message = response.choices[0].message
+        if getattr(message, "refusal", None):
+            raise ValueError(f"Model refused to answer: {message.refusal}")
+        return message.content
+
 class AnthropicClient(APIClient):
-    def __init__(self, model):
-        self.client = anthropic.Anthropic()
-        self.model = model
+    def __init__(self, model, agent=None, cache=None, prompt_caching=False):
+        super().__init__(model, agent=agent, cache=cache, prompt_caching=prompt_caching)
+        self.client = get_transport("anthropic")
+        self.rate_limiter = get_rate_limiter("anthropic")
+
+    def _request(self, estimated_tokens, **params):
+        attempt = 0
+        while True:
+            self.rate_limiter.acquire(estimated_tokens)
+            try:
+                raw_response = self.client.messages.with_raw_response.create(model=self.model, **params)
+                break
+            except anthropic.RateLimitError as e:
+                self._handle_rate_limit(e, attempt)
+                attempt += 1
+        self.rate_limiter.update_from_headers(raw_response.headers)
+        response = raw_response.parse()
+        self.rate_limiter.reconcile(estimated_tokens, response.usage.input_tokens + response.usage.output_tokens)
+        self._record_anthropic_usage(response.usage)
+        return response
+
+    def _create_chat_completion(self, messages, system, temperature, max_tokens):
+        response = self._request(
+            estimate_tokens(messages, system),
+            system=self._anthropic_system(system),
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature
+        )
+        return response.content[0].text
+
+    def _create_structured_completion(self, messages, system, temperature, max_tokens, schema, name):
+        response = self._request(
+            estimate_tokens(messages, system),
+            system=self._anthropic_system(system),
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            tools=[anthropic_tool(schema, name)],
+            tool_choice={"type": "tool", "name": name}
+        )
+        return tool_use_json(response.content, name)
+
+class AsyncAPIClient(APIClient):
+    async def create_chat_completion(self, messages, system=None, temperature=0.0, max_tokens=4096):
+        key = self._request_key(messages, system, temperature, max_tokens)
+        return await self._serve_async(key, lambda: self._create_chat_completion(messages, system, temperature, max_tokens))
+
+    async def create_structured_completion(self, messages, schema, system=None, temperature=0.0, max_tokens=4096, name="respond"):
+        key = self._request_key(messages, system, temperature, max_tokens, schema=schema)
+        content = await self._serve_async(key, lambda: self._create_structured_completion(messages, system, temperature, max_tokens, schema, name))
+        return parse_structured_output(content, schema)
+
+    async def _serve_async(self, key, complete):
+        cassette = get_cassette()
+        if cassette is not None and cassette.replaying:
+            return await cassette.replay_async("llm", key)
+
+        async def timed_complete():
+            with get_metrics().timer("treelex_llm_request_seconds", agent=self.agent, model=self.model):
+                content = await complete()
+            if self.cache:
+                self.cache.put(key, content, model=self.model)
+            return content
+
+        started = time.perf_counter()
+        content = self._get_cached(key)
+        if content is None:
+            content = await get_single_flight().do_async(key, timed_complete)
+        if cassette is not None:
+            cassette.record("llm", key, content, time.perf_counter() - started, model=self.model, agent=self.agent)
+        return content
+
+class AsyncOpenAIClient(AsyncAPIClient):
+    def __init__(self, model, agent=None, cache=None, prompt_caching=False):
+        super().__init__(model, agent=agent, cache=cache, prompt_caching=prompt_caching)
+        self.client = get_transport("openai", asynchronous=True)
+        self.rate_limiter = get_rate_limiter("openai")
 
-    def create_chat_completion(self, messages, system, temperature=0.0, max_tokens=4096):
-        response = self.client.messages.create(
-            model=self.model,
-            system=system,
+    async def _request(self, estimated_tokens, **params):
+        attempt = 0
+        while True:
+            await self.rate_limiter.acquire_async(estimated_tokens)
+            try:
+                raw_response = await self.client.chat.completions.with_raw_response.create(model=self.model, **params)
+                break
+            except openai.RateLimitError as e:
+                self._handle_rate_limit(e, attempt)
+                attempt += 1
+        self.rate_limiter.update_from_headers(raw_response.headers)
+        response = raw_response.parse()
+        self.rate_limiter.reconcile(estimated_tokens, response.usage.total_tokens)
+        self._record_openai_usage(response.usage)
+        return response
+
+    async def _create_chat_completion(self, messages, system, temperature, max_tokens):
+        response = await self._request(
+            estimate_tokens(messages),
+            messages=messages,
+            response_format={"type": "json_object"},
+            max_tokens=max_tokens,
+            temperature=temperature,
+            extra_body=self._openai_extra_body(messages)
+        )
+        return response.choices[0].message.content
+
+    async def _create_structured_completion(self, messages, system, temperature, max_tokens, schema, name):
+        response = await self._request(
+            estimate_tokens(messages),
+            messages=messages,
+            response_format=openai_response_format(schema, name),
+            max_tokens=max_tokens,
+            temperature=temperature,
+            extra_body=self._openai_extra_body(messages)
+        )
+        message = response.choices[0].message
+        if getattr(message, "refusal", None):
+            raise ValueError(f"Model refused to answer: {message.refusal}")
+        return message.content
+
+class AsyncAnthropicClient(AsyncAPIClient):
+    def __init__(self, model, agent=None, cache=None, prompt_caching=False):
+        super().__init__(model, agent=agent, cache=cache, prompt_caching=prompt_caching)
+        self.client = get_transport("anthropic", asynchronous=True)
+        self.rate_limiter = get_rate_limiter("anthropic")
+
+    async def _request(self, estimated_tokens, **params):
+        attempt = 0
+        while True:
+            await self.rate_limiter.acquire_async(estimated_tokens)
+            try:
+                raw_response = await self.client.messages.with_raw_response.create(model=self.model, **params)
+                break
+            except anthropic.RateLimitError as e:
+                self._handle_rate_limit(e, attempt)
+                attempt += 1
+        self.rate_limiter.update_from_headers(raw_response.headers)
+        response = raw_response.parse()
+        self.rate_limiter.reconcile(estimated_tokens, response.usage.input_tokens + response.usage.output_tokens)
+        self._record_anthropic_usage(response.usage)
+        return response
+
+    async def _create_chat_completion(self, messages, system, temperature, max_tokens):
+        response = await self._request(
+            estimate_tokens(messages, system),
+            system=self._anthropic_system(system),
             messages=messages,
             max_tokens=max_tokens,
             temperature=temperature
         )
-        time.sleep(SLEEP_TIME)
-        return response.content[0].text
\ No newline at end of file
+        return response.content[0].text
+
+    async def _create_structured_completion(self, messages, system, temperature, max_tokens, schema, name):
+        response = await self._request(
+            estimate_tokens(messages, system),
+            system=self._anthropic_system(system),
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            tools=[anthropic_tool(schema, name)],
+            tool_choice={"type": "tool", "name": name}
+        )
+        return tool_use_json(response.content, name)
@@ -0,0 +1,201 @@
+import io
+import json
+import time
+import logging
+from abc import ABC, abstractmethod
+from utils.agent_registry import get_transport
+from utils.llm_cache import LLMCache, get_default_cache
+from utils.structured_output import anthropic_tool, openai_response_format
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s - %(filename)s - %(funcName)s')
+
+DEFAULT_POLL_INTERVAL = 60
+DEFAULT_MAX_TOKENS = 4096
+
+
+def make_batch_request(custom_id, messages, system=None, temperature=0.0, max_tokens=DEFAULT_MAX_TOKENS, schema=None, name="respond"):
+    """
+    :param schema: Ask for structured output matching this JSON schema, like `create_structured_completion`.
+    :param name: Tool / response format name used with `schema`.
+    """
+    return {
+        "custom_id": custom_id,
+        "messages": messages,
+        "system": system,
+        "temperature": temperature,
+        "max_tokens": max_tokens,
+        "schema": schema,
+        "name": name,
+    }
+
+
+def request_cache_key(model, request):
+    # Same key the interactive clients use, so batch results are served to them from the cache.
+    extra = {"schema": request["schema"]} if request.get("schema") else {}
+    return LLMCache.make_key(model, request["system"], request["messages"], request["temperature"], request["max_tokens"], **extra)
+
+
+def message_text(content):
+    """Text of an Anthropic reply, or the tool arguments as JSON when the model answered with a tool call."""
+    for block in content:
+        if block.type == "tool_use":
+            return json.dumps(block.input, ensure_ascii=False)
+    return content[0].text
+
+
+class BatchClient(ABC):
+    """
+    Submits many chat completions as one provider batch job and waits for the results.
+
+    Results are also written to the response cache under the same key the
+    interactive clients use, so a later interactive run reuses them for free.
+    """
+
+    def __init__(self, model, agent=None, cache=None, poll_interval=DEFAULT_POLL_INTERVAL):
+        self.model = model
+        self.agent = agent
+        self.cache = cache if cache is not None else get_default_cache()
+        self.poll_interval = poll_interval
+
+    @abstractmethod
+    def submit(self, requests):
+        pass
+
+    @abstractmethod
+    def is_done(self, batch_id):
+        pass
+
+    @abstractmethod
+    def results(self, batch_id):
+        pass
+
+    def run(self, requests, timeout=None):
+        """
+        Submit `requests`, poll until the batch ends and return {custom_id: text}.
+
+        Requests that errored or expired map to None.
+        """
+        if not requests:
+            return {}
+        batch_id = self.submit(requests)
+        logging.info(f"Submitted batch {batch_id} with {len(requests)} requests")
+        started = time.monotonic()
+        while not self.is_done(batch_id):
+            if timeout is not None and time.monotonic() - started > timeout:
+                raise TimeoutError(f"Batch {batch_id} did not finish within {timeout}s")
+            time.sleep(self.poll_interval)
+
+        results = self.results(batch_id)
+        if self.cache:
+            for request in requests:
+                text = results.get(request["custom_id"])
+                if text is not None:
+                    self.cache.put(request_cache_key(self.model, request), text, model=self.model)
+        failed = sum(1 for request in requests if results.get(request["custom_id"]) is None)
+        logging.info(f"Batch {batch_id} finished: {len(requests) - failed} succeeded, {failed} failed")
+        return {request["custom_id"]: results.get(request["custom_id"]) for request in requests}
+
+    def reject(self, request):
+        """Remove a batch result that failed validation from the response cache."""
+        if self.cache:
+            self.cache.delete(request_cache_key(self.model, request))
+
+
+class AnthropicBatchClient(BatchClient):
+    def __init__(self, model, agent=None, cache=None, poll_interval=DEFAULT_POLL_INTERVAL, base_url=None):
+        super().__init__(model, agent=agent, cache=cache, poll_interval=poll_interval)
+        self.client = get_transport("anthropic", base_url=base_url)
+
+    def submit(self, requests):
+        batch = self.client.messages.batches.create(requests=[
+            {
+                "custom_id": request["custom_id"],
+                "params": {
+                    key: value for key, value in {
+                        "model": self.model,
+                        "system": request["system"],
+                        "messages": request["messages"],
+                        "max_tokens": request["max_tokens"],
+                        "temperature": request["temperature"],
+                        "tools": [anthropic_tool(request["schema"], request["name"])] if request.get("schema") else None,
+                        "tool_choice": {"type": "tool", "name": request["name"]} if request.get("schema") else None,
+                    }.items() if value is not None
+                }
+            } for request in requests
+        ])
+        return batch.id
+
+    def is_done(self, batch_id):
+        return self.client.messages.batches.retrieve(batch_id).processing_status == "ended"
+
+    def results(self, batch_id):
+        results = {}
+        for entry in self.client.messages.batches.results(batch_id):
+            if entry.result.type == "succeeded":
+                results[entry.custom_id] = message_text(entry.result.message.content)
+            else:
+                logging.error(f"Batch request {entry.custom_id} {entry.result.type}")
+                results[entry.custom_id] = None
+        return results
+
+
+class OpenAIBatchClient(BatchClient):
+    def __init__(self, model, agent=None, cache=None, poll_interval=DEFAULT_POLL_INTERVAL, base_url=None):
+        super().__init__(model, agent=agent, cache=cache, poll_interval=poll_interval)
+        self.client = get_transport("openai", base_url=base_url)
+
+    def submit(self, requests):
+        lines = []
+        for request in requests:
+            lines.append(json.dumps({
+                "custom_id": request["custom_id"],
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {
+                    "model": self.model,
+                    "messages": request["messages"],
+                    "response_format": openai_response_format(request["schema"], request["name"]) if request.get("schema") else {"type": "json_object"},
+                    "max_tokens": request["max_tokens"],
+                    "temperature": request["temperature"],
+                }
+            }, ensure_ascii=False))
+        batch_file = self.client.files.create(
+            file=("batch.jsonl", io.BytesIO("\n".join(lines).encode("utf-8"))),
+            purpose="batch"
+        )
+        batch = self.client.batches.create(
+            input_file_id=batch_file.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h"
+        )
+        return batch.id
+
+    def is_done(self, batch_id):
+        return self.client.batches.retrieve(batch_id).status in ("completed", "failed", "expired", "cancelled")
+
+    def results(self, batch_id):
+        batch = self.client.batches.retrieve(batch_id)
+        results = {}
+        if not batch.output_file_id:
+            logging.error(f"Batch {batch_id} ended with status {batch.status} and no output")
+            return results
+        for line in self.client.files.content(batch.output_file_id).text.splitlines():
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            response = entry.get("response") or {}
+            if response.get("status_code") == 200:
+                results[entry["custom_id"]] = response["body"]["choices"][0]["message"]["content"]
+            else:
+                logging.error(f"Batch request {entry['custom_id']} failed: {entry.get('error')}")
+                results[entry["custom_id"]] = None
+        return results
+
+
+def create_batch_client(api_type, model, agent=None, **kwargs):
+    if api_type.lower() == "openai":
+        return OpenAIBatchClient(model, agent=agent, **kwargs)
+    elif api_type.lower() == "anthropic":
+        return AnthropicBatchClient(model, agent=agent, **kwargs)
+    else:
+        raise ValueError(f"Unsupported API type: {api_type}")
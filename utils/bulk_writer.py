@@ -0,0 +1,247 @@
+import os
+import json
+import atexit
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from multiprocessing import util as multiprocessing_util
+from utils.lemma_backend import get_lemma_ops
+from utils.enumeration_allocator import get_enumeration_allocator
+from utils.lemma_cache import get_lemma_cache, base_lemma_of
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s - %(filename)s - %(funcName)s')
+
+DEFAULT_MAX_BATCH = 100
+# Seconds a queued write may wait before it is sent.
+DEFAULT_FLUSH_INTERVAL = 2.0
+# Statuses meaning the server has no bulk endpoint.
+UNSUPPORTED_STATUSES = (404, 405, 501)
+# Idempotency keys of sent writes remembered to drop repeats; the oldest are forgotten first.
+MAX_WRITTEN_KEYS = 100000
+
+CREATE = "create"
+UPDATE = "update"
+
+_default_writer = None
+_default_writer_lock = threading.Lock()
+
+
+def idempotency_key(kind, payload):
+    encoded = json.dumps({"kind": kind, "payload": payload}, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class BulkWriter:
+    """
+    Write-behind buffer for lexiwebdb creates and updates.
+
+    Writes are queued and sent as one bulk request per kind when `max_batch` writes are
+    waiting, every `flush_interval` seconds, on `flush()`, and at interpreter or
+    worker-process exit. Within a flush, creates go before updates so an
+    update can target a lemma created in the same batch, and updates of one lemma are
+    merged.
+
+    Each write carries an idempotency key derived from its content: a write queued twice
+    is sent once, and a retried create that the server reports as existing is treated
+    as done. Without a bulk endpoint (the client has no bulk operation, or the server
+    answers 404/405/501) the writer falls back to one request per row.
+
+    :param max_batch: Writes per bulk request.
+    :param flush_interval: Longest time a write stays queued, in seconds.
+    """
+
+    def __init__(self, max_batch=DEFAULT_MAX_BATCH, flush_interval=DEFAULT_FLUSH_INTERVAL):
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.wakeup = threading.Condition(self.lock)
+        self.pending = []
+        self.queued_keys = set()
+        self.written_keys = OrderedDict()
+        self.bulk_supported = {CREATE: True, UPDATE: True}
+        self.closed = False
+
+        self.thread = threading.Thread(target=self._run, name="lexiwebdb-bulk-writer", daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+        # Pool workers leave through os._exit, which skips atexit but runs multiprocessing finalizers.
+        multiprocessing_util.Finalize(self, self.close, exitpriority=10)
+
+    def create(self, data):
+        """Queue the creation of an enumerated lemma. :return: The write's idempotency key."""
+        return self._enqueue(CREATE, None, data)
+
+    def update(self, enumerated_lemma, data):
+        """Queue an update of an existing enumerated lemma. :return: The write's idempotency key."""
+        return self._enqueue(UPDATE, enumerated_lemma, data)
+
+    def _enqueue(self, kind, target, data):
+        key = idempotency_key(kind, {"target": target, "data": data})
+        with self.lock:
+            if self.closed:
+                raise RuntimeError("BulkWriter is closed")
+            if key in self.queued_keys or key in self.written_keys:
+                return key
+            self.queued_keys.add(key)
+            self.pending.append((kind, target, data, key))
+            if len(self.pending) >= self.max_batch:
+                self.wakeup.notify()
+        return key
+
+    def _run(self):
+        while True:
+            with self.lock:
+                self.wakeup.wait_for(lambda: self.closed or len(self.pending) >= self.max_batch, timeout=self.flush_interval)
+                if self.closed:
+                    return
+            self.flush()
+
+    def flush(self):
+        """Send every queued write now."""
+        with self.flush_lock:
+            with self.lock:
+                pending, self.pending = self.pending, []
+            if not pending:
+                return
+            creates = [(data, key) for kind, _, data, key in pending if kind == CREATE]
+            updates = {}
+            for kind, target, data, key in pending:
+                if kind == UPDATE:
+                    merged, keys = updates.get(target, ({}, []))
+                    merged.update(data)
+                    updates[target] = (merged, keys + [key])
+
+            for start in range(0, len(creates), self.max_batch):
+                self._write_creates(creates[start:start + self.max_batch])
+            update_rows = list(updates.items())
+            for start in range(0, len(update_rows), self.max_batch):
+                self._write_updates(update_rows[start:start + self.max_batch])
+
+            with self.lock:
+                self.queued_keys.difference_update(key for _, _, _, key in pending)
+            logging.info(f"Flushed {len(creates)} creates and {len(updates)} updates to lexiwebdb")
+
+    def _bulk(self, kind, operation_name, rows):
+        """Try the bulk endpoint. :return: True if the server accepted the batch."""
+        operation = getattr(get_lemma_ops(), operation_name, None)
+        if not self.bulk_supported[kind] or operation is None:
+            return False
+        try:
+            response = operation(data=rows)
+        except Exception as e:
+            logging.error(f"Bulk {kind} of {len(rows)} rows failed, writing them one by one: {e}")
+            return False
+        if response.status_code in UNSUPPORTED_STATUSES:
+            logging.info(f"lexiwebdb has no bulk {kind} endpoint, writing rows one by one")
+            self.bulk_supported[kind] = False
+            return False
+        if response.status_code >= 300:
+            logging.error(f"Bulk {kind} of {len(rows)} rows returned {response.status_code}, writing them one by one")
+            return False
+        return True
+
+    def _write_creates(self, creates):
+        rows = [dict(data, idempotency_key=key) for data, key in creates]
+        if self._bulk(CREATE, "bulk_create_enumerated_lemmas", rows):
+            self._mark_written(key for _, key in creates)
+        else:
+            for data, key in creates:
+                try:
+                    create_row(data)
+                    self._mark_written([key])
+                except Exception as e:
+                    logging.error(f"Error creating enumerated lemma {data['enumerated_lemma']}: {e}")
+        self._invalidate(data['enumerated_lemma'] for data, _ in creates)
+
+    def _write_updates(self, updates):
+        rows = [{"enumerated_lemma": target, "data": data, "idempotency_key": keys[-1]} for target, (data, keys) in updates]
+        if self._bulk(UPDATE, "bulk_update_enumerated_lemmas", rows):
+            self._mark_written(key for _, (_, keys) in updates for key in keys)
+        else:
+            for target, (data, keys) in updates:
+                try:
+                    response = get_lemma_ops().update_enumerated_lemma(target, data=data)
+                    if response.status_code >= 300:
+                        raise Exception(f"status {response.status_code}")
+                    self._mark_written(keys)
+                except Exception as e:
+                    logging.error(f"Error updating enumerated lemma {target}: {e}")
+        self._invalidate(target for target, _ in updates)
+
+    def _mark_written(self, keys):
+        with self.lock:
+            for key in keys:
+                self.written_keys[key] = True
+                self.written_keys.move_to_end(key)
+            while len(self.written_keys) > MAX_WRITTEN_KEYS:
+                self.written_keys.popitem(last=False)
+
+    def _invalidate(self, enumerated_lemmas):
+        # Only once the rows are in lexiwebdb, so a read in between cannot re-cache the old list.
+        get_lemma_cache().invalidate(*{base_lemma_of(enumerated_lemma) for enumerated_lemma in enumerated_lemmas})
+
+    def close(self):
+        """Flush and stop the background thread. Safe to call more than once."""
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            self.wakeup.notify()
+        self.flush()
+
+
+def create_row(data):
+    """
+    Create one enumerated lemma.
+
+    If lexiwebdb already holds the number, a row with the same definition means this write
+    already went through (e.g. a bulk request that timed out after succeeding). Otherwise
+    the number was taken by something outside the allocator, and the row is renumbered once.
+    """
+    try:
+        _create(data)
+    except Exception as e:
+        if "Enumerated Lemma already exists" not in str(e):
+            raise
+        if _already_written(data):
+            logging.info(f"{data['enumerated_lemma']} was already written")
+            return
+        allocator = get_enumeration_allocator()
+        allocator.refresh(data['base_lemma'])
+        data = dict(data, enumerated_lemma=data['base_lemma'] + '_' + str(allocator.reserve(data['base_lemma'])))
+        _create(data)
+        logging.info(f"Created {data['enumerated_lemma']} after a numbering collision")
+
+
+def _create(data):
+    response = get_lemma_ops().create_enumerated_lemma(data=data)
+    if response.status_code >= 300:
+        # The body is kept so an "already exists" answer is recognised like the raised error.
+        raise Exception(f"status {response.status_code}: {getattr(response, 'text', '')}")
+
+
+def _already_written(data):
+    cache = get_lemma_cache()
+    cache.invalidate(data['base_lemma'])
+    return any(
+        lemma['enumerated_lemma'] == data['enumerated_lemma'] and lemma.get('definition') == data['definition']
+        for lemma in cache.get(data['base_lemma']) or []
+    )
+
+
+def get_bulk_writer():
+    """
+    Return the process-wide writer.
+
+    TREELEX_DB_BATCH_SIZE and TREELEX_DB_FLUSH_INTERVAL override its batch size and flush interval.
+    """
+    global _default_writer
+    with _default_writer_lock:
+        if _default_writer is None or _default_writer.closed:
+            _default_writer = BulkWriter(
+                max_batch=int(os.getenv("TREELEX_DB_BATCH_SIZE", DEFAULT_MAX_BATCH)),
+                flush_interval=float(os.getenv("TREELEX_DB_FLUSH_INTERVAL", DEFAULT_FLUSH_INTERVAL))
+            )
+        return _default_writer
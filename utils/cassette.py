@@ -0,0 +1,250 @@
+import os
+import sys
+import json
+import time
+import base64
+import asyncio
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from collections import defaultdict, deque
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s - %(filename)s - %(funcName)s')
+
+RECORD = "record"
+REPLAY = "replay"
+
+_active_cassette = None
+_active_lock = threading.Lock()
+_configured_from_env = False
+
+
+class CassetteMiss(LookupError):
+    """Raised in replay mode when a request was never recorded."""
+
+
+class Cassette:
+    """
+    Records every external interaction of a run to a JSONL file, or serves them back.
+
+    Two kinds of traffic are captured: LLM completions (hooked in `APIClient`, keyed
+    like the response cache) and HTTP calls made through `requests`, which is how the
+    Stanza service and the lexiwebdb API are reached. A request seen several times
+    (e.g. a lemma lookup before and after it is created) is replayed in recorded order;
+    the last recorded answer is repeated once they run out.
+
+    :param path: Cassette file. Record mode overwrites it.
+    :param mode: "record" or "replay".
+    :param latency: Replay delay per interaction: None for none, "recorded" to sleep for
+                    the time the original call took, or a number of seconds.
+    """
+
+    def __init__(self, path, mode=REPLAY, latency=None):
+        if mode not in (RECORD, REPLAY):
+            raise ValueError(f"Unsupported cassette mode: {mode}")
+        self.path = Path(path)
+        self.mode = mode
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.interactions = defaultdict(deque)
+        self.last_played = {}
+        self.file = None
+
+        if mode == RECORD:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self.file = open(self.path, "w", encoding="utf-8")
+        else:
+            self.load()
+
+    @property
+    def recording(self):
+        return self.mode == RECORD
+
+    @property
+    def replaying(self):
+        return self.mode == REPLAY
+
+    def load(self):
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self.interactions[(entry["kind"], entry["key"])].append(entry)
+        logging.info(f"Loaded {sum(len(entries) for entries in self.interactions.values())} interactions from {self.path}")
+
+    def record(self, kind, key, response, elapsed, **request):
+        entry = {"kind": kind, "key": key, "request": request, "response": response, "elapsed": elapsed}
+        with self.lock:
+            self.file.write(json.dumps(entry, ensure_ascii=False, default=str) + "\n")
+            self.file.flush()
+
+    def next_entry(self, kind, key):
+        with self.lock:
+            entries = self.interactions.get((kind, key))
+            if entries:
+                entry = entries.popleft()
+                self.last_played[(kind, key)] = entry
+            else:
+                entry = self.last_played.get((kind, key))
+        if entry is None:
+            raise CassetteMiss(f"No recorded {kind} interaction for key {key} in {self.path}")
+        return entry
+
+    def delay(self, entry):
+        if self.latency is None:
+            return 0
+        if self.latency == "recorded":
+            return entry.get("elapsed") or 0
+        return float(self.latency)
+
+    def replay(self, kind, key):
+        entry = self.next_entry(kind, key)
+        delay = self.delay(entry)
+        if delay:
+            time.sleep(delay)
+        return entry["response"]
+
+    async def replay_async(self, kind, key):
+        entry = self.next_entry(kind, key)
+        delay = self.delay(entry)
+        if delay:
+            await asyncio.sleep(delay)
+        return entry["response"]
+
+    def close(self):
+        if self.file:
+            self.file.close()
+            self.file = None
+
+
+def http_key(method, url, params=None, data=None, json_body=None):
+    payload = {"method": method.upper(), "url": url, "params": params, "data": data, "json": json_body}
+    encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def _serialize_response(response):
+    serialized = {
+        "status_code": response.status_code,
+        "reason": response.reason,
+        "url": response.url,
+        "headers": dict(response.headers),
+        "encoding": response.encoding,
+    }
+    try:
+        serialized["body"] = response.content.decode("utf-8")
+    except UnicodeDecodeError:
+        serialized["body_b64"] = base64.b64encode(response.content).decode("ascii")
+    return serialized
+
+
+def _build_response(serialized, request=None):
+    import requests
+    from requests.structures import CaseInsensitiveDict
+
+    response = requests.Response()
+    response.status_code = serialized["status_code"]
+    response.reason = serialized.get("reason")
+    response.url = serialized.get("url")
+    response.headers = CaseInsensitiveDict(serialized.get("headers") or {})
+    response.encoding = serialized.get("encoding") or "utf-8"
+    if "body_b64" in serialized:
+        response._content = base64.b64decode(serialized["body_b64"])
+    else:
+        response._content = serialized.get("body", "").encode("utf-8")
+    response.request = request
+    return response
+
+
+def _install_http_hook():
+    """Route every `requests` call through the active cassette."""
+    import requests
+
+    if getattr(requests.Session.request, "_cassette_hook", False):
+        return
+    original_request = requests.Session.request
+
+    def request(session, method, url, params=None, data=None, json=None, **kwargs):
+        cassette = _active_cassette
+        if cassette is None:
+            return original_request(session, method, url, params=params, data=data, json=json, **kwargs)
+        key = http_key(method, url, params, data, json)
+        if cassette.replaying:
+            return _build_response(cassette.replay("http", key))
+        started = time.perf_counter()
+        response = original_request(session, method, url, params=params, data=data, json=json, **kwargs)
+        cassette.record("http", key, _serialize_response(response), time.perf_counter() - started, method=method.upper(), url=url)
+        return response
+
+    request._cassette_hook = True
+    requests.Session.request = request
+
+
+def use_cassette(path, mode=REPLAY, latency=None):
+    """Activate a cassette for the whole process and return it."""
+    global _active_cassette
+    cassette = Cassette(path, mode=mode, latency=latency)
+    try:
+        _install_http_hook()
+    except ImportError:
+        logging.warning("requests is not installed; only LLM traffic goes through the cassette.")
+    with _active_lock:
+        if _active_cassette is not None:
+            _active_cassette.close()
+        _active_cassette = cassette
+    logging.info(f"Cassette {path} active in {mode} mode")
+    return cassette
+
+
+def eject_cassette():
+    global _active_cassette
+    with _active_lock:
+        if _active_cassette is not None:
+            _active_cassette.close()
+        _active_cassette = None
+
+
+def get_cassette():
+    """
+    The active cassette, if any.
+
+    The first call also honours TREELEX_CASSETTE (path), TREELEX_CASSETTE_MODE
+    (record/replay, default replay) and TREELEX_CASSETTE_LATENCY ("recorded" or seconds).
+    """
+    global _configured_from_env
+    if not _configured_from_env:
+        _configured_from_env = True
+        path = os.environ.get("TREELEX_CASSETTE")
+        if path and _active_cassette is None:
+            use_cassette(
+                path,
+                mode=os.environ.get("TREELEX_CASSETTE_MODE", REPLAY).lower(),
+                latency=os.environ.get("TREELEX_CASSETTE_LATENCY")
+            )
+    return _active_cassette
+
+
+if __name__ == "__main__":
+    # Usage: python -m utils.cassette record|replay <cassette.jsonl> <phrase_list> [language] [native_language] [latency]
+    mode, cassette_path, phrase_file = sys.argv[1], sys.argv[2], Path(sys.argv[3])
+    language = sys.argv[4] if len(sys.argv) > 4 else "Hungarian"
+    native_language = sys.argv[5] if len(sys.argv) > 5 else "English"
+    latency = sys.argv[6] if len(sys.argv) > 6 else None
+
+    use_cassette(cassette_path, mode=mode, latency=latency)
+    from phrase_processor import PhraseProcessor
+    from utils.metrics import get_metrics
+
+    with open(phrase_file, "r", encoding="utf-8") as f:
+        phrases = [line.strip() for line in f if line.strip()]
+
+    started = time.perf_counter()
+    processor = PhraseProcessor(language, native_language)
+    entries = [processor.process_phrase(phrase) for phrase in phrases]
+    elapsed = time.perf_counter() - started
+    eject_cassette()
+
+    print(json.dumps(entries, ensure_ascii=False, indent=2))
+    print(f"{len(phrases)} phrases in {elapsed:.2f}s ({len(phrases) / elapsed:.2f} phrases/s)")
+    get_metrics().dump_json(Path(cassette_path).with_suffix(".metrics.json"))
@@ -1,6 +1,7 @@
 import json
 import logging
-from lexiwebdb.client.src.operations import enumerated_lemma_ops
+from utils.enumeration_allocator import get_enumeration_allocator, fetch_high_water_mark
+from utils.bulk_writer import get_bulk_writer
 
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s - %(filename)s - %(funcName)s')
@@ -57,18 +58,25 @@ def find_pos_in_phrase_info(word, phrase_info):
     return None
 
 def get_enumeration(word):
-    response = enumerated_lemma_ops.get_enumerated_lemma_by_base_lemma(word.lower())
-    if response.status_code == 200:
-        enumerated_lemmas = response.json()['enumerated_lemmas']
-        return str(int(enumerated_lemmas[-1]['enumerated_lemma'].split('_')[1]) + 1)
-    else:
-        logging.info(f"No Base lemma found for word: {word}")
-    
-    return None
+    """
+    The sense number the next entry of `word` would get ("1" for a new base lemma).
+
+    Nothing is reserved: the number follows from what lexiwebdb holds, so a rerun over the
+    same database proposes the same numbers. `add_definition_to_db` reserves the final one.
+    """
+    return str(fetch_high_water_mark(word) + 1)
 
 
 def add_definition_to_db(entry):
-    logging.info(json.dumps(entry, indent=4, ensure_ascii=False))
+    """
+    Queue `entry` for creation; it reaches lexiwebdb with the next flush of the bulk writer.
+
+    The sense number is reserved here, only for entries that are written, and stored back in
+    `entry['enumeration']`.
+    """
+    base_lemma = entry['base_lemma'].lower()
+    entry['enumeration'] = base_lemma + '_' + str(get_enumeration_allocator().reserve(base_lemma))
+    logging.info(f"Queueing {entry['enumeration']}: {entry['definition']}")
     data = {
         'enumerated_lemma': entry['enumeration'].lower(),
         'base_lemma': entry['base_lemma'].lower(),
@@ -84,15 +92,7 @@ def add_definition_to_db(entry):
         'active': False,  # Assuming not active by default
         'anki_card_ids': [] # Assuming no anki card ids are provided
     }
-    try:
-        response = enumerated_lemma_ops.create_enumerated_lemma(data=data)
-        logging.info(json.dumps(response.json(), indent=4))
-    except Exception as e:
-        logging.error(f"Error creating enumerated lemma: {e}")
-        if "Enumerated Lemma already exists" in str(e):
-            data['enumerated_lemma'] = data['base_lemma'] + '_' + str(int(data['enumerated_lemma'].split('_')[1]) + 10)
-            response = enumerated_lemma_ops.create_enumerated_lemma(data=data)
-            logging.info(json.dumps(response.json(), indent=4))
+    get_bulk_writer().create(data)
 
 def split_dictionary_content(content, target_lines=100, tolerance=25):
     lines = content.split('\n')
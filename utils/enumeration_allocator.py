@@ -0,0 +1,122 @@
+import os
+import sqlite3
+import logging
+import threading
+from pathlib import Path
+from utils.lemma_cache import get_lemma_cache
+from utils.lemma_backend import SQLITE, LEXIWEBDB
+from utils import sqlite_lemma_ops
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s - %(filename)s - %(funcName)s')
+
+DEFAULT_ALLOCATOR_PATH = Path("data/cache/enumerations.sqlite3")
+# Seconds a process waits for another one holding the reservation lock.
+LOCK_TIMEOUT = 30
+
+_default_allocator = None
+_default_allocator_lock = threading.Lock()
+
+
+def fetch_high_water_mark(base_lemma):
+    """Highest sense number lexiwebdb holds for `base_lemma`, 0 if it has none."""
+    numbers = [
+        int(lemma['enumerated_lemma'].rsplit('_', 1)[1])
+        for lemma in get_lemma_cache().get(base_lemma) or []
+        if lemma['enumerated_lemma'].rsplit('_', 1)[-1].isdigit()
+    ]
+    return max(numbers, default=0)
+
+
+class EnumerationAllocator:
+    """
+    Hands out sense numbers (the `n` of `kutya_n`) without asking lexiwebdb every time.
+
+    The high-water mark of a base lemma is fetched from lexiwebdb the first time it is
+    needed and kept in a small SQLite table; every reservation after that is a local
+    `BEGIN IMMEDIATE` transaction, which serialises threads and processes sharing the
+    file, so two writers never receive the same number.
+
+    The marks are only valid for the store they were read from, so the default file depends
+    on the backend (see `default_allocator_path`).
+
+    :param path: SQLite file shared by every process of a run.
+    """
+
+    def __init__(self, path=DEFAULT_ALLOCATOR_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        connection = self._connection()
+        connection.execute("CREATE TABLE IF NOT EXISTS high_water (base_lemma TEXT PRIMARY KEY, last INTEGER NOT NULL)")
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            # Autocommit mode, so the reservation transaction is controlled explicitly.
+            connection = sqlite3.connect(str(self.path), timeout=LOCK_TIMEOUT, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            self._local.connection = connection
+        return connection
+
+    def _known(self, base_lemma):
+        row = self._connection().execute("SELECT last FROM high_water WHERE base_lemma = ?", (base_lemma,)).fetchone()
+        return row is not None
+
+    def reserve(self, base_lemma, count=1):
+        """
+        Reserve `count` consecutive sense numbers for `base_lemma`.
+
+        :return: The first reserved number.
+        """
+        base_lemma = base_lemma.lower()
+        # Fetched outside the transaction so the lock is never held across an HTTP call.
+        fetched = None if self._known(base_lemma) else fetch_high_water_mark(base_lemma)
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = connection.execute("SELECT last FROM high_water WHERE base_lemma = ?", (base_lemma,)).fetchone()
+            last = max(row[0] if row else 0, fetched or 0)
+            connection.execute(
+                "INSERT INTO high_water (base_lemma, last) VALUES (?, ?) "
+                "ON CONFLICT(base_lemma) DO UPDATE SET last = excluded.last",
+                (base_lemma, last + count)
+            )
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        return last + 1
+
+    def refresh(self, base_lemma):
+        """Raise the local mark to lexiwebdb's, e.g. after entries were written by another tool."""
+        base_lemma = base_lemma.lower()
+        get_lemma_cache().invalidate(base_lemma)
+        fetched = fetch_high_water_mark(base_lemma)
+        connection = self._connection()
+        connection.execute(
+            "INSERT INTO high_water (base_lemma, last) VALUES (?, ?) "
+            "ON CONFLICT(base_lemma) DO UPDATE SET last = MAX(last, excluded.last)",
+            (base_lemma, fetched)
+        )
+        logging.info(f"High-water mark of '{base_lemma}' refreshed from lexiwebdb: {fetched}")
+
+
+def default_allocator_path():
+    """
+    The allocator file for the configured lemma backend.
+
+    With the sqlite backend the marks live in the store's own database file, so a different
+    or freshly created store starts from its own senses. lexiwebdb keeps the shared file.
+    """
+    if os.getenv("TREELEX_LEMMA_BACKEND", LEXIWEBDB).lower() == SQLITE:
+        return Path(os.getenv("TREELEX_SQLITE_LEMMA_DB", sqlite_lemma_ops.DEFAULT_DB_PATH))
+    return DEFAULT_ALLOCATOR_PATH
+
+
+def get_enumeration_allocator():
+    """Return the process-wide allocator, stored in TREELEX_ENUMERATION_DB if set, else in `default_allocator_path()`."""
+    global _default_allocator
+    with _default_allocator_lock:
+        if _default_allocator is None:
+            _default_allocator = EnumerationAllocator(os.getenv("TREELEX_ENUMERATION_DB") or default_allocator_path())
+        return _default_allocator
@@ -0,0 +1,276 @@
+import json
+import time
+import uuid
+import logging
+import threading
+from datetime import datetime, timezone, timedelta
+from email.parser import BytesParser
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s - %(filename)s - %(funcName)s')
+
+
+def default_responder(params):
+    return "{}"
+
+
+class FakeBatchServer:
+    """
+    Local stand-in for the Anthropic Message Batches and OpenAI Batch APIs.
+
+    Point AnthropicBatchClient at `anthropic_base_url` or OpenAIBatchClient at
+    `openai_base_url`. Every request in a batch is answered by `responder(params)`,
+    which receives the request parameters and returns the reply text; batches
+    report as finished once `processing_delay` seconds have passed.
+    """
+
+    def __init__(self, responder=default_responder, host="127.0.0.1", port=0, processing_delay=0.0):
+        self.responder = responder
+        self.processing_delay = processing_delay
+        self.batches = {}
+        self.files = {}
+        self.lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def anthropic_base_url(self):
+        return self.base_url
+
+    @property
+    def openai_base_url(self):
+        return f"{self.base_url}/v1"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        logging.info(f"Fake batch server listening on {self.base_url}")
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _is_done(self, batch):
+        return time.time() - batch["created"] >= self.processing_delay
+
+    def _complete(self, batch):
+        if "results" in batch:
+            return batch["results"]
+        results = []
+        for custom_id, params in batch["requests"]:
+            try:
+                results.append((custom_id, self.responder(params), None))
+            except Exception as e:
+                results.append((custom_id, None, str(e)))
+        batch["results"] = results
+        return results
+
+    # Anthropic Message Batches
+
+    def create_anthropic_batch(self, body):
+        batch_id = f"msgbatch_{uuid.uuid4().hex}"
+        with self.lock:
+            self.batches[batch_id] = {
+                "created": time.time(),
+                "requests": [(request["custom_id"], request["params"]) for request in body["requests"]],
+            }
+        return self.anthropic_batch(batch_id)
+
+    def anthropic_batch(self, batch_id):
+        batch = self.batches[batch_id]
+        done = self._is_done(batch)
+        created_at = datetime.fromtimestamp(batch["created"], timezone.utc)
+        counts = {"processing": 0, "succeeded": 0, "errored": 0, "canceled": 0, "expired": 0}
+        if done:
+            for _, text, error in self._complete(batch):
+                counts["errored" if error else "succeeded"] += 1
+        else:
+            counts["processing"] = len(batch["requests"])
+        return {
+            "id": batch_id,
+            "type": "message_batch",
+            "processing_status": "ended" if done else "in_progress",
+            "request_counts": counts,
+            "created_at": created_at.isoformat(),
+            "expires_at": (created_at + timedelta(hours=24)).isoformat(),
+            "ended_at": datetime.now(timezone.utc).isoformat() if done else None,
+            "archived_at": None,
+            "cancel_initiated_at": None,
+            "results_url": f"{self.base_url}/v1/messages/batches/{batch_id}/results" if done else None,
+        }
+
+    def anthropic_results(self, batch_id):
+        lines = []
+        for custom_id, text, error in self._complete(self.batches[batch_id]):
+            if error:
+                result = {"type": "errored", "error": {"type": "error", "error": {"type": "api_error", "message": error}}}
+            else:
+                result = {"type": "succeeded", "message": {
+                    "id": f"msg_{uuid.uuid4().hex}",
+                    "type": "message",
+                    "role": "assistant",
+                    "model": dict(self.batches[batch_id]["requests"])[custom_id].get("model", ""),
+                    "content": [{"type": "text", "text": text}],
+                    "stop_reason": "end_turn",
+                    "stop_sequence": None,
+                    "usage": {"input_tokens": 0, "output_tokens": 0},
+                }}
+            lines.append(json.dumps({"custom_id": custom_id, "result": result}, ensure_ascii=False))
+        return "\n".join(lines)
+
+    # OpenAI Files and Batch
+
+    def create_openai_file(self, content_type, body):
+        message = BytesParser().parsebytes(f"Content-Type: {content_type}\r\n\r\n".encode("utf-8") + body)
+        content = b""
+        filename = "batch.jsonl"
+        for part in message.get_payload():
+            if part.get_param("name", header="content-disposition") == "file":
+                content = part.get_payload(decode=True)
+                filename = part.get_filename() or filename
+        file_id = f"file-{uuid.uuid4().hex}"
+        with self.lock:
+            self.files[file_id] = content.decode("utf-8")
+        return self.openai_file(file_id, filename)
+
+    def openai_file(self, file_id, filename="batch.jsonl"):
+        return {
+            "id": file_id,
+            "object": "file",
+            "bytes": len(self.files[file_id].encode("utf-8")),
+            "created_at": int(time.time()),
+            "filename": filename,
+            "purpose": "batch",
+            "status": "processed",
+        }
+
+    def create_openai_batch(self, body):
+        batch_id = f"batch_{uuid.uuid4().hex}"
+        requests = []
+        for line in self.files[body["input_file_id"]].splitlines():
+            if line.strip():
+                request = json.loads(line)
+                requests.append((request["custom_id"], request["body"]))
+        with self.lock:
+            self.batches[batch_id] = {
+                "created": time.time(),
+                "requests": requests,
+                "input_file_id": body["input_file_id"],
+                "endpoint": body["endpoint"],
+                "completion_window": body["completion_window"],
+            }
+        return self.openai_batch(batch_id)
+
+    def openai_batch(self, batch_id):
+        batch = self.batches[batch_id]
+        done = self._is_done(batch)
+        output_file_id = None
+        if done:
+            output_file_id = batch.get("output_file_id")
+            if not output_file_id:
+                output_file_id = f"file-{uuid.uuid4().hex}"
+                with self.lock:
+                    self.files[output_file_id] = self.openai_results(batch)
+                    batch["output_file_id"] = output_file_id
+        return {
+            "id": batch_id,
+            "object": "batch",
+            "endpoint": batch["endpoint"],
+            "input_file_id": batch["input_file_id"],
+            "completion_window": batch["completion_window"],
+            "status": "completed" if done else "in_progress",
+            "output_file_id": output_file_id,
+            "created_at": int(batch["created"]),
+            "request_counts": {"total": len(batch["requests"]), "completed": len(batch["requests"]) if done else 0, "failed": 0},
+        }
+
+    def openai_results(self, batch):
+        lines = []
+        for custom_id, text, error in self._complete(batch):
+            if error:
+                response = {"status_code": 500, "request_id": uuid.uuid4().hex, "body": {"error": {"message": error}}}
+            else:
+                response = {"status_code": 200, "request_id": uuid.uuid4().hex, "body": {
+                    "id": f"chatcmpl-{uuid.uuid4().hex}",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": dict(batch["requests"])[custom_id].get("model", ""),
+                    "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": text}}],
+                    "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+                }}
+            lines.append(json.dumps({"id": f"batch_req_{uuid.uuid4().hex}", "custom_id": custom_id, "response": response, "error": None}, ensure_ascii=False))
+        return "\n".join(lines)
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                logging.debug(format % args)
+
+            def _send(self, status, payload, content_type="application/json"):
+                body = payload if isinstance(payload, str) else json.dumps(payload, ensure_ascii=False)
+                body = body.encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _body(self):
+                return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+            def do_POST(self):
+                path = self.path.split("?")[0].rstrip("/")
+                if path == "/v1/messages/batches":
+                    self._send(200, server.create_anthropic_batch(json.loads(self._body())))
+                elif path == "/v1/files":
+                    self._send(200, server.create_openai_file(self.headers.get("Content-Type"), self._body()))
+                elif path == "/v1/batches":
+                    self._send(200, server.create_openai_batch(json.loads(self._body())))
+                else:
+                    self._send(404, {"error": {"message": f"Unknown path {path}"}})
+
+            def do_GET(self):
+                parts = self.path.split("?")[0].strip("/").split("/")
+                try:
+                    if parts[:3] == ["v1", "messages", "batches"] and len(parts) == 4:
+                        self._send(200, server.anthropic_batch(parts[3]))
+                    elif parts[:3] == ["v1", "messages", "batches"] and len(parts) == 5 and parts[4] == "results":
+                        self._send(200, server.anthropic_results(parts[3]), "application/x-jsonl")
+                    elif parts[:2] == ["v1", "batches"] and len(parts) == 3:
+                        self._send(200, server.openai_batch(parts[2]))
+                    elif parts[:2] == ["v1", "files"] and len(parts) == 4 and parts[3] == "content":
+                        self._send(200, server.files[parts[2]], "application/octet-stream")
+                    elif parts[:2] == ["v1", "files"] and len(parts) == 3:
+                        self._send(200, server.openai_file(parts[2]))
+                    else:
+                        self._send(404, {"error": {"message": f"Unknown path {self.path}"}})
+                except KeyError:
+                    self._send(404, {"error": {"message": f"Not found: {self.path}"}})
+
+        return Handler
+
+
+if __name__ == "__main__":
+    # Serve canned replies so batch mode can be exercised without network access.
+    def echo_word(params):
+        content = params["messages"][-1]["content"]
+        return json.dumps({"word": content.split(":")[1].split(".")[0].strip(), "def": "placeholder"}, ensure_ascii=False)
+
+    with FakeBatchServer(responder=echo_word) as fake_server:
+        print(f"Anthropic base_url: {fake_server.anthropic_base_url}")
+        print(f"OpenAI base_url: {fake_server.openai_base_url}")
+        fake_server.thread.join()
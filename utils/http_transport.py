@@ -0,0 +1,131 @@
+import os
+import logging
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s - %(filename)s - %(funcName)s')
+
+DEFAULT_POOL_SIZE = 16
+DEFAULT_CONNECT_TIMEOUT = 3.05
+DEFAULT_READ_TIMEOUT = 60
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 0.3
+# Only requests that are safe to repeat are retried.
+RETRIED_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+RETRIED_STATUSES = (429, 500, 502, 503, 504)
+
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+
+
+class PooledSession(requests.Session):
+    """A `requests.Session` that applies default connect/read timeouts to every request."""
+
+    def __init__(self, timeout):
+        super().__init__()
+        self.timeout = timeout
+        self.pool_size = 0
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        return super().request(method, url, **kwargs)
+
+    def mount_pool(self, pool_size, retries, backoff):
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff,
+            status_forcelist=RETRIED_STATUSES,
+            allowed_methods=RETRIED_METHODS,
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.mount("http://", adapter)
+        self.mount("https://", adapter)
+        self.pool_size = pool_size
+
+
+def get_session(pool_size=None):
+    """
+    Return the process-wide keep-alive session, creating it on first use.
+
+    TREELEX_HTTP_POOL_SIZE, TREELEX_HTTP_CONNECT_TIMEOUT, TREELEX_HTTP_READ_TIMEOUT and
+    TREELEX_HTTP_RETRIES configure it. Asking for a larger `pool_size` than the session
+    has (e.g. for a bigger worker pool) grows its connection pools.
+    """
+    global _session, _session_pid
+    with _session_lock:
+        # A forked worker must not reuse its parent's sockets.
+        if _session is None or _session_pid != os.getpid():
+            timeout = (
+                float(os.getenv("TREELEX_HTTP_CONNECT_TIMEOUT", DEFAULT_CONNECT_TIMEOUT)),
+                float(os.getenv("TREELEX_HTTP_READ_TIMEOUT", DEFAULT_READ_TIMEOUT))
+            )
+            _session = PooledSession(timeout)
+            _session_pid = os.getpid()
+            pool_size = max(pool_size or 0, int(os.getenv("TREELEX_HTTP_POOL_SIZE", DEFAULT_POOL_SIZE)))
+        elif not pool_size or pool_size <= _session.pool_size:
+            return _session
+        _session.mount_pool(pool_size, int(os.getenv("TREELEX_HTTP_RETRIES", DEFAULT_RETRIES)), DEFAULT_BACKOFF)
+        logging.info(f"HTTP transport: {pool_size} pooled connections per host, timeouts {_session.timeout}")
+        return _session
+
+
+class SessionAPI:
+    """
+    The module-level `requests` API (`requests.get`, `requests.post`, ...) served by the pooled
+    session, with the same signatures. Anything else is looked up on `requests` itself, so
+    `requests.exceptions` and the like keep working in a client that is given this object.
+    """
+
+    def request(self, method, url, **kwargs):
+        return get_session().request(method, url, **kwargs)
+
+    def get(self, url, params=None, **kwargs):
+        return self.request("GET", url, params=params, **kwargs)
+
+    def options(self, url, **kwargs):
+        return self.request("OPTIONS", url, **kwargs)
+
+    def head(self, url, **kwargs):
+        kwargs.setdefault("allow_redirects", False)
+        return self.request("HEAD", url, **kwargs)
+
+    def post(self, url, data=None, json=None, **kwargs):
+        return self.request("POST", url, data=data, json=json, **kwargs)
+
+    def put(self, url, data=None, **kwargs):
+        return self.request("PUT", url, data=data, **kwargs)
+
+    def patch(self, url, data=None, **kwargs):
+        return self.request("PATCH", url, data=data, **kwargs)
+
+    def delete(self, url, **kwargs):
+        return self.request("DELETE", url, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(requests, name)
+
+
+_session_api = SessionAPI()
+
+
+def install_http_transport(*clients, pool_size=None):
+    """
+    Route the HTTP calls of the given client modules through the pooled session.
+
+    The lexiwebdb and Stanza clients call the module-level `requests` API; their `requests`
+    global is replaced with a `SessionAPI`, so they share the session's keep-alive
+    connections, timeouts and GET retries without changes to either client. The `requests`
+    module itself is left alone, so other code (e.g. scraping third-party sites) is unaffected.
+
+    :param clients: Client modules that `import requests`. Others are skipped.
+    :param pool_size: Minimum number of connections kept per host, e.g. the worker count.
+    """
+    get_session(pool_size)
+    for client in clients:
+        if getattr(client, "requests", None) is requests:
+            client.requests = _session_api
+            logging.info(f"HTTP transport: {client.__name__} uses the pooled session")
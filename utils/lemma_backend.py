@@ -0,0 +1,34 @@
+import os
+import logging
+import threading
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s - %(filename)s - %(funcName)s')
+
+LEXIWEBDB = "lexiwebdb"
+SQLITE = "sqlite"
+
+_ops = None
+_ops_lock = threading.Lock()
+
+
+def get_lemma_ops():
+    """
+    Return the module implementing the `enumerated_lemma_ops` operations for this run.
+
+    TREELEX_LEMMA_BACKEND selects it: "lexiwebdb" (default) talks to the lexiwebdb API,
+    "sqlite" uses the embedded store in utils.sqlite_lemma_ops (file set by
+    TREELEX_SQLITE_LEMMA_DB), which needs neither the API nor Postgres.
+    """
+    global _ops
+    with _ops_lock:
+        if _ops is None:
+            backend = os.getenv("TREELEX_LEMMA_BACKEND", LEXIWEBDB).lower()
+            if backend == SQLITE:
+                from utils import sqlite_lemma_ops as ops
+            elif backend == LEXIWEBDB:
+                from lexiwebdb.client.src.operations import enumerated_lemma_ops as ops
+            else:
+                raise ValueError(f"Unsupported lemma backend: {backend}")
+            logging.info(f"Enumerated lemmas are stored in {backend}")
+            _ops = ops
+        return _ops
@@ -0,0 +1,203 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from pathlib import Path
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from utils.lemma_backend import get_lemma_ops
+from utils.metrics import get_metrics
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s - %(filename)s - %(funcName)s')
+
+DEFAULT_MAX_ENTRIES = 50000
+# Seconds an entry is trusted; bounds staleness from writers in other processes.
+DEFAULT_MAX_AGE = 600
+# Base lemmas per bulk lookup, and concurrent lookups when there is no bulk endpoint.
+PREFETCH_BATCH_SIZE = 500
+PREFETCH_WORKERS = 16
+# Statuses meaning the server has no bulk lookup endpoint.
+UNSUPPORTED_STATUSES = (404, 405, 501)
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+# Marks a cached 404 in the in-memory LRU.
+_MISSING = object()
+
+
+def base_lemma_of(enumerated_lemma):
+    return enumerated_lemma.rsplit('_', 1)[0]
+
+
+class LemmaCache:
+    """
+    Read-through cache of the enumerated lemmas lexiwebdb holds per base lemma.
+
+    Lookups are served from an in-process LRU and, when `path` is given, from a SQLite
+    file that other processes of the run share. A 404 is cached as "no such lemma".
+    Writes made through the bulk writer invalidate the base lemmas they touch once they
+    reach lexiwebdb; writes by other tools are picked up after `max_age` seconds.
+
+    :param max_entries: Base lemmas kept in memory.
+    :param max_age: Seconds before an entry is fetched again.
+    :param path: Optional SQLite file shared between processes.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, max_age=DEFAULT_MAX_AGE, path=None):
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.connection = None
+        if path:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self.connection = sqlite3.connect(str(path), check_same_thread=False)
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS lemmas (base_lemma TEXT PRIMARY KEY, enumerated_lemmas TEXT, stored REAL NOT NULL)"
+            )
+            self.connection.commit()
+
+    def get(self, base_lemma):
+        """
+        The enumerated lemmas of `base_lemma`, or None if lexiwebdb has none.
+
+        Errors other than a 404 return None without being cached.
+        """
+        base_lemma = base_lemma.lower()
+        found, enumerated_lemmas = self._lookup(base_lemma)
+        if found:
+            get_metrics().inc("treelex_lemma_cache_hits_total")
+            return enumerated_lemmas
+
+        get_metrics().inc("treelex_lemma_cache_misses_total")
+        response = get_lemma_ops().get_enumerated_lemma_by_base_lemma(base_lemma)
+        if response.status_code == 200:
+            enumerated_lemmas = response.json()['enumerated_lemmas']
+        elif response.status_code == 404:
+            enumerated_lemmas = None
+        else:
+            logging.error(f"Lookup of '{base_lemma}' returned {response.status_code}")
+            return None
+        self._store(base_lemma, enumerated_lemmas)
+        return enumerated_lemmas
+
+    def prefetch(self, base_lemmas, batch_size=PREFETCH_BATCH_SIZE, workers=PREFETCH_WORKERS):
+        """
+        Load the senses of many base lemmas into the cache ahead of the workers that need them.
+
+        Lemmas already cached are skipped. The rest are fetched `batch_size` at a time through
+        the client's bulk lookup when it has one, and with `workers` concurrent single
+        lookups otherwise.
+
+        :return: Number of base lemmas fetched.
+        """
+        candidates = {base_lemma.lower() for base_lemma in base_lemmas if base_lemma}
+        missing = sorted(base_lemma for base_lemma in candidates if not self._lookup(base_lemma)[0])
+        if not missing:
+            return 0
+        remaining = []
+        bulk = True
+        for start in range(0, len(missing), batch_size):
+            batch = missing[start:start + batch_size]
+            # After one failed bulk lookup, the rest go straight to single lookups.
+            bulk = bulk and self._bulk_fetch(batch)
+            if not bulk:
+                remaining.extend(batch)
+        if remaining:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                list(pool.map(self.get, remaining))
+        logging.info(f"Prefetched {len(missing)} base lemmas, {len(missing) - len(remaining)} through bulk lookups")
+        return len(missing)
+
+    def _bulk_fetch(self, base_lemmas):
+        """:return: False if the bulk lookup is unavailable, so the batch must be fetched one by one."""
+        operation = getattr(get_lemma_ops(), "get_enumerated_lemmas_by_base_lemmas", None)
+        if operation is None:
+            return False
+        try:
+            response = operation(base_lemmas)
+        except Exception as e:
+            logging.error(f"Bulk lookup of {len(base_lemmas)} base lemmas failed: {e}")
+            return False
+        if response.status_code != 200:
+            if response.status_code not in UNSUPPORTED_STATUSES:
+                logging.error(f"Bulk lookup of {len(base_lemmas)} base lemmas returned {response.status_code}")
+            return False
+        found = {base_lemma: [] for base_lemma in base_lemmas}
+        for lemma in response.json()['enumerated_lemmas']:
+            found.setdefault(lemma['base_lemma'].lower(), []).append(lemma)
+        get_metrics().inc("treelex_lemma_cache_misses_total", len(base_lemmas))
+        for base_lemma, enumerated_lemmas in found.items():
+            # Lemmas absent from the reply are cached as misses, like a 404.
+            self._store(base_lemma, enumerated_lemmas or None)
+        return True
+
+    def _lookup(self, base_lemma):
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(base_lemma)
+            if entry is not None and now - entry[1] <= self.max_age:
+                self.entries.move_to_end(base_lemma)
+                return True, None if entry[0] is _MISSING else entry[0]
+            if self.connection is None:
+                return False, None
+            row = self.connection.execute(
+                "SELECT enumerated_lemmas, stored FROM lemmas WHERE base_lemma = ?", (base_lemma,)
+            ).fetchone()
+        if row is None or now - row[1] > self.max_age:
+            return False, None
+        enumerated_lemmas = json.loads(row[0])
+        self._remember(base_lemma, enumerated_lemmas, row[1])
+        return True, enumerated_lemmas
+
+    def _remember(self, base_lemma, enumerated_lemmas, stored):
+        with self.lock:
+            self.entries[base_lemma] = (_MISSING if enumerated_lemmas is None else enumerated_lemmas, stored)
+            self.entries.move_to_end(base_lemma)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def _store(self, base_lemma, enumerated_lemmas):
+        stored = time.time()
+        self._remember(base_lemma, enumerated_lemmas, stored)
+        if self.connection is not None:
+            with self.lock:
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO lemmas (base_lemma, enumerated_lemmas, stored) VALUES (?, ?, ?)",
+                    (base_lemma, json.dumps(enumerated_lemmas, ensure_ascii=False), stored)
+                )
+                self.connection.commit()
+
+    def invalidate(self, *base_lemmas):
+        with self.lock:
+            for base_lemma in base_lemmas:
+                self.entries.pop(base_lemma.lower(), None)
+            if self.connection is not None:
+                self.connection.executemany("DELETE FROM lemmas WHERE base_lemma = ?", [(base_lemma.lower(),) for base_lemma in base_lemmas])
+                self.connection.commit()
+
+
+def get_lemma_cache():
+    """
+    Return the process-wide lemma cache.
+
+    TREELEX_LEMMA_CACHE sets a SQLite file to share it between processes, TREELEX_LEMMA_CACHE_SIZE
+    its in-memory size and TREELEX_LEMMA_CACHE_MAX_AGE its freshness in seconds.
+    """
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = LemmaCache(
+                max_entries=int(os.getenv("TREELEX_LEMMA_CACHE_SIZE", DEFAULT_MAX_ENTRIES)),
+                max_age=float(os.getenv("TREELEX_LEMMA_CACHE_MAX_AGE", DEFAULT_MAX_AGE)),
+                path=os.getenv("TREELEX_LEMMA_CACHE")
+            )
+        return _default_cache
+
+
+def get_enumerated_lemmas(base_lemma):
+    """Cached `get_enumerated_lemma_by_base_lemma`: the list of senses, or None if there are none."""
+    return get_lemma_cache().get(base_lemma)
@@ -0,0 +1,145 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from collections import defaultdict
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s - %(filename)s - %(funcName)s')
+
+DEFAULT_CACHE_PATH = Path("data/cache/llm_responses.sqlite3")
+DEFAULT_MAX_ENTRIES = 200000
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+DEFAULT_MAX_AGE = 30 * 24 * 3600
+EVICT_EVERY = 500
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+class LLMCache:
+    """
+    Durable, content-addressed cache of chat completion responses backed by SQLite.
+
+    Entries are keyed on a hash of everything that determines the reply (model,
+    system prompt, messages, temperature, max_tokens) and evicted by age, entry
+    count and total size.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES, max_age=DEFAULT_MAX_AGE):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        self.stats = defaultdict(lambda: {"hits": 0, "misses": 0})
+        self.puts = 0
+
+        self.connection = sqlite3.connect(str(self.path), check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, model TEXT, response TEXT NOT NULL, "
+            "size INTEGER NOT NULL, created REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self.connection.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+        self.connection.commit()
+        self.evict()
+
+    @staticmethod
+    def make_key(model, system, messages, temperature, max_tokens, **extra):
+        payload = {
+            "model": model,
+            "system": system,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+        }
+        payload.update(extra)
+        encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+    def get(self, key, agent=None):
+        now = time.time()
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT response, created FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row and now - row[1] <= self.max_age:
+                self.connection.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+                self.connection.commit()
+                self.stats[agent or "unknown"]["hits"] += 1
+                return row[0]
+            self.stats[agent or "unknown"]["misses"] += 1
+            return None
+
+    def put(self, key, response, model=None):
+        if response is None:
+            return
+        now = time.time()
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO responses (key, model, response, size, created, last_used) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, response, len(response.encode("utf-8")), now, now)
+            )
+            self.connection.commit()
+            self.puts += 1
+            evict = self.puts % EVICT_EVERY == 0
+        if evict:
+            self.evict()
+
+    def delete(self, key):
+        with self.lock:
+            self.connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self.connection.commit()
+
+    def evict(self):
+        with self.lock:
+            cursor = self.connection.cursor()
+            cursor.execute("DELETE FROM responses WHERE created < ?", (time.time() - self.max_age,))
+            count, total_size = cursor.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+            if count > self.max_entries or total_size > self.max_bytes:
+                # Drop the least recently used entries until both limits hold again.
+                rows = cursor.execute("SELECT key, size FROM responses ORDER BY last_used ASC").fetchall()
+                stale = []
+                for key, size in rows:
+                    if count <= self.max_entries and total_size <= self.max_bytes:
+                        break
+                    stale.append((key,))
+                    count -= 1
+                    total_size -= size
+                cursor.executemany("DELETE FROM responses WHERE key = ?", stale)
+                logging.info(f"Evicted {len(stale)} cached LLM responses")
+            self.connection.commit()
+
+    def get_stats(self):
+        with self.lock:
+            return {agent: dict(counts) for agent, counts in self.stats.items()}
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+def get_default_cache():
+    """
+    Return the process-wide response cache.
+
+    Set TREELEX_LLM_CACHE to a file path to relocate it, or to `off` to disable caching.
+    """
+    global _default_cache
+    setting = os.getenv("TREELEX_LLM_CACHE", str(DEFAULT_CACHE_PATH))
+    if setting.lower() in ("off", "0", "false", "none"):
+        return None
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = LLMCache(setting)
+        return _default_cache
+
+
+def get_cache_stats():
+    return _default_cache.get_stats() if _default_cache else {}
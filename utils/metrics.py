@@ -0,0 +1,170 @@
+import json
+import time
+import bisect
+import threading
+import functools
+from pathlib import Path
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+HELP = {
+    "treelex_llm_request_seconds": "Latency of upstream LLM requests.",
+    "treelex_llm_input_tokens_total": "Prompt tokens sent to the provider.",
+    "treelex_llm_output_tokens_total": "Completion tokens returned by the provider.",
+    "treelex_llm_cached_tokens_total": "Prompt tokens served from the provider's prompt cache.",
+    "treelex_llm_cache_write_tokens_total": "Prompt tokens written to the provider's prompt cache.",
+    "treelex_llm_cache_hits_total": "Replies served from the local response cache.",
+    "treelex_llm_cache_misses_total": "Requests not found in the local response cache.",
+    "treelex_agent_call_seconds": "Latency of agent operations including retries.",
+    "treelex_agent_retries_total": "Retries fired by agent retry loops.",
+    "treelex_agent_validation_failures_total": "Replies rejected by schema or parse validation.",
+    "treelex_cascade_requests_total": "Requests sent to each tier of an agent's model cascade.",
+    "treelex_cascade_escalations_total": "Rejected replies retried on the next model of the cascade.",
+    "treelex_lemma_cache_hits_total": "Sense lists of a base lemma served from the lemma cache.",
+    "treelex_lemma_cache_misses_total": "Sense lists of a base lemma fetched from lexiwebdb.",
+    "treelex_pos_llm_calls_avoided_total": "Parts of speech taken from Stanza's UPOS instead of asking the POS agent.",
+    "treelex_rate_limit_wait_seconds_total": "Time spent waiting on the client-side rate limiter.",
+}
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def to_dict(self):
+        cumulative = 0
+        buckets = {}
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            cumulative += count
+            buckets["+Inf" if bound == float("inf") else str(bound)] = cumulative
+        return {"count": self.count, "sum": self.sum, "buckets": buckets}
+
+
+class MetricsRegistry:
+    """Process-wide counters and latency histograms, labelled by agent, model and provider."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted((key, str(value)) for key, value in labels.items() if value is not None))
+
+    def inc(self, name, value=1, **labels):
+        key = self._key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = self._key(name, labels)
+        with self.lock:
+            if key not in self.histograms:
+                self.histograms[key] = Histogram()
+            self.histograms[key].observe(value)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def get_counter(self, name, **labels):
+        with self.lock:
+            return self.counters.get(self._key(name, labels), 0)
+
+    def reset(self):
+        with self.lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def to_json(self):
+        with self.lock:
+            return {
+                "counters": [
+                    {"name": name, "labels": dict(labels), "value": value}
+                    for (name, labels), value in sorted(self.counters.items())
+                ],
+                "histograms": [
+                    dict({"name": name, "labels": dict(labels)}, **histogram.to_dict())
+                    for (name, labels), histogram in sorted(self.histograms.items(), key=lambda item: item[0])
+                ],
+            }
+
+    def dump_json(self, path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_json(), f, indent=2, ensure_ascii=False)
+
+    def to_prometheus(self):
+        """Render all metrics in the Prometheus text exposition format."""
+        lines = []
+        described = set()
+
+        def describe(name, metric_type):
+            if name not in described:
+                described.add(name)
+                if name in HELP:
+                    lines.append(f"# HELP {name} {HELP[name]}")
+                lines.append(f"# TYPE {name} {metric_type}")
+
+        def render_labels(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ""
+            return "{" + ",".join(f'{key}="{_escape_label(value)}"' for key, value in pairs) + "}"
+
+        with self.lock:
+            for (name, labels), value in sorted(self.counters.items()):
+                describe(name, "counter")
+                lines.append(f"{name}{render_labels(labels)} {value}")
+            for (name, labels), histogram in sorted(self.histograms.items(), key=lambda item: item[0]):
+                describe(name, "histogram")
+                for bound, count in histogram.to_dict()["buckets"].items():
+                    lines.append(f"{name}_bucket{render_labels(labels, [('le', bound)])} {count}")
+                lines.append(f"{name}_sum{render_labels(labels)} {histogram.sum}")
+                lines.append(f"{name}_count{render_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+_registry = MetricsRegistry()
+
+
+def get_metrics():
+    return _registry
+
+
+def record_retry(agent):
+    _registry.inc("treelex_agent_retries_total", agent=agent)
+
+
+def record_validation_failure(agent):
+    _registry.inc("treelex_agent_validation_failures_total", agent=agent)
+
+
+def instrumented(operation):
+    """Time an agent method under treelex_agent_call_seconds, labelled with the agent's class name."""
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with _registry.timer("treelex_agent_call_seconds", agent=type(self).__name__, operation=operation):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorator
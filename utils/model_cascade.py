@@ -0,0 +1,132 @@
+import os
+import logging
+import threading
+from utils.api_clients import OpenAIClient, AnthropicClient
+from utils.metrics import get_metrics
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s - %(filename)s - %(funcName)s')
+
+# The model a rejected reply is escalated to, per provider.
+ADVANCED_MODELS = {
+    "anthropic": "claude-3-5-sonnet-20240620",
+    "openai": "gpt-4o",
+}
+
+
+class CascadeClient:
+    """
+    Sends each request to the first (cheapest) model and escalates only on rejection.
+
+    When an agent rejects a reply with `reject_last_response()` (jsonschema validation,
+    `DefinitionChecker.basic_check` or the match reviewer failed), its retry of the same
+    request on that thread goes to the next model in the cascade. Retries are recognised
+    by their messages starting with the rejected request's messages, so correction
+    messages appended by the agent still count as the same request. An agent that
+    rewrites the prompt for its retry (the matcher drops the definition its reviewer
+    rejected) says so with `reject_last_response(revised=True)`.
+    """
+
+    def __init__(self, clients):
+        self.clients = clients
+        self.model = clients[0].model
+        self.agent = clients[0].agent
+        self._local = threading.local()
+
+    @property
+    def models(self):
+        return [client.model for client in self.clients]
+
+    @property
+    def tiers(self):
+        return len(self.clients)
+
+    def create_chat_completion(self, messages, system=None, **kwargs):
+        return self._route(messages, system).create_chat_completion(messages, system=system, **kwargs)
+
+    def create_structured_completion(self, messages, schema, system=None, **kwargs):
+        return self._route(messages, system).create_structured_completion(messages, schema, system=system, **kwargs)
+
+    def _route(self, messages, system):
+        tier = self._pending_tier(messages, system)
+        self._local.last = (tier, system, list(messages))
+        if tier > 0:
+            get_metrics().inc(
+                "treelex_cascade_escalations_total",
+                agent=self.agent,
+                from_model=self.clients[tier - 1].model,
+                to_model=self.clients[tier].model
+            )
+            logging.info(f"{self.agent}: escalating rejected request from {self.clients[tier - 1].model} to {self.clients[tier].model}")
+        get_metrics().inc("treelex_cascade_requests_total", agent=self.agent, model=self.clients[tier].model, tier=tier)
+        return self.clients[tier]
+
+    def reject_last_response(self, revised=False):
+        """
+        :param revised: The retry is the same task with a rewritten prompt, so the next request
+                        on this thread escalates whatever its messages are.
+        """
+        last = getattr(self._local, "last", None)
+        if last is None:
+            return
+        tier, system, messages = last
+        self.clients[tier].reject_last_response()
+        self._local.last = None
+        if tier + 1 < len(self.clients):
+            self._local.escalation = (tier + 1, system, None if revised else messages)
+
+    def _pending_tier(self, messages, system):
+        escalation = getattr(self._local, "escalation", None)
+        self._local.escalation = None
+        if escalation is None:
+            return 0
+        tier, rejected_system, rejected_messages = escalation
+        if system != rejected_system:
+            return 0
+        if rejected_messages is None or list(messages[:len(rejected_messages)]) == rejected_messages:
+            return tier
+        return 0
+
+
+def cascade_enabled():
+    return os.environ.get("TREELEX_MODEL_CASCADE", "on").lower() not in ("off", "0", "false")
+
+
+def create_cascade_client(api_type, model, agent=None, **client_kwargs):
+    """
+    Build a CascadeClient that starts on `model` and escalates to the provider's advanced model.
+
+    Agents configured with the advanced model already, or runs with TREELEX_MODEL_CASCADE=off,
+    get a single-tier cascade.
+
+    :param client_kwargs: Passed to each provider client, e.g. `prompt_caching`.
+    """
+    api_type = api_type.lower()
+    if api_type == "openai":
+        client_class = OpenAIClient
+    elif api_type == "anthropic":
+        client_class = AnthropicClient
+    else:
+        raise ValueError(f"Unsupported API type: {api_type}")
+
+    models = [model]
+    if cascade_enabled() and ADVANCED_MODELS[api_type] != model:
+        models.append(ADVANCED_MODELS[api_type])
+    return CascadeClient([client_class(tier_model, agent=agent, **client_kwargs) for tier_model in models])
+
+
+def get_escalation_rates():
+    """Escalations per first-tier request, per agent."""
+    requests = {}
+    escalations = {}
+    for counter in get_metrics().to_json()["counters"]:
+        agent = counter["labels"].get("agent")
+        if counter["name"] == "treelex_cascade_requests_total" and counter["labels"].get("tier") == "0":
+            requests[agent] = requests.get(agent, 0) + counter["value"]
+        elif counter["name"] == "treelex_cascade_escalations_total":
+            escalations[agent] = escalations.get(agent, 0) + counter["value"]
+
+    rates = {}
+    for agent, count in requests.items():
+        escalated = escalations.get(agent, 0)
+        rates[agent] = {"requests": count, "escalations": escalated, "rate": escalated / count if count else 0.0}
+    return rates
@@ -0,0 +1,117 @@
+import sys
+import json
+import logging
+from pathlib import Path
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s - %(filename)s - %(funcName)s')
+
+# Token fields each agent actually reads from the Stanza analysis.
+MATCHER_FIELDS = ("text", "lemma", "pos", "deprel")
+REVIEWER_FIELDS = ("text", "lemma", "pos", "deprel")
+DEFINITION_FIELDS = ("text", "lemma", "pos")
+SEPARATOR = "|"
+
+
+def compact_json(obj):
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False)
+
+
+def _cell(value):
+    return str(value if value is not None else "").replace(SEPARATOR, "/").replace("\n", " ")
+
+
+def encode_phrase_info(phrase_info, fields=MATCHER_FIELDS):
+    """
+    Turn Stanza's phrase_info into a dense table with one header row and one row per token.
+
+    :param phrase_info: List of sentences with a `tokens` list, as returned by the Stanza service.
+    :param fields: Token fields to keep, in column order.
+    :return: e.g. "text|lemma|pos\\nA|a|DET\\nkutya|kutya|NOUN"; sentences are separated by a blank line.
+    """
+    if not phrase_info:
+        return ""
+    if isinstance(phrase_info, str):
+        try:
+            phrase_info = json.loads(phrase_info)
+        except json.JSONDecodeError:
+            return phrase_info
+    sentences = phrase_info if isinstance(phrase_info, list) else [phrase_info]
+    blocks = []
+    for sentence in sentences:
+        rows = [SEPARATOR.join(_cell(token.get(field)) for field in fields) for token in sentence.get("tokens", [])]
+        blocks.append("\n".join(rows))
+    return SEPARATOR.join(fields) + "\n" + "\n\n".join(blocks)
+
+
+def encode_definitions(definitions):
+    """Encode {enumerated_lemma: {"def": ..., "pos": ...}} as `id|pos|def` rows."""
+    rows = ["id|pos|def"]
+    for enumerated_lemma, definition in definitions.items():
+        rows.append(SEPARATOR.join([_cell(enumerated_lemma), _cell(definition.get("pos")), _cell(definition.get("def"))]))
+    return "\n".join(rows)
+
+
+def encode_match_input(input_data, fields=MATCHER_FIELDS):
+    """Compact form of the Matcher / MatchReviewer input dictionaries."""
+    encoded = {}
+    for key, value in input_data.items():
+        if key == "phrase_info":
+            encoded[key] = encode_phrase_info(value, fields)
+        elif key == "definitions" and isinstance(value, dict):
+            encoded[key] = encode_definitions(value)
+        else:
+            encoded[key] = value
+    return compact_json(encoded)
+
+
+def count_tokens(text):
+    try:
+        import tiktoken
+        return len(tiktoken.get_encoding("cl100k_base").encode(text))
+    except ImportError:
+        from utils.rate_limiter import estimate_tokens
+        return estimate_tokens([{"content": text}])
+
+
+def _fallback_phrase_info(phrase):
+    return [{"text": phrase, "tokens": [{"text": word, "lemma": word.lower(), "pos": "X", "deprel": "dep"} for word in phrase.split()]}]
+
+
+def benchmark(phrases, phrase_infos):
+    """Compare the previous pretty-printed prompt payloads with the compact encoding per agent."""
+    totals = {agent: {"before": 0, "after": 0} for agent in ("Matcher", "MatchReviewer", "DefinitionGenerator")}
+    for phrase, phrase_info in zip(phrases, phrase_infos):
+        for token in phrase_info[0]["tokens"]:
+            word = token["text"].lower()
+            definitions = {f"{word}_{n}": {"def": f"definition {n} of {word}", "pos": token.get("pos", "")} for n in (1, 2, 3)}
+            match_input = {"phrase": phrase, "base_lemma": word, "phrase_info": phrase_info, "definitions": definitions}
+            review_input = {"phrase": phrase, "base_lemma": word, "phrase_info": phrase_info, "definition": definitions[f"{word}_1"]["def"]}
+
+            totals["Matcher"]["before"] += count_tokens(json.dumps(match_input, indent=4, ensure_ascii=False))
+            totals["Matcher"]["after"] += count_tokens(encode_match_input(match_input, MATCHER_FIELDS))
+            totals["MatchReviewer"]["before"] += count_tokens(json.dumps(review_input, indent=4, ensure_ascii=False))
+            totals["MatchReviewer"]["after"] += count_tokens(encode_match_input(review_input, REVIEWER_FIELDS))
+            totals["DefinitionGenerator"]["before"] += count_tokens(str(phrase_info))
+            totals["DefinitionGenerator"]["after"] += count_tokens(encode_phrase_info(phrase_info, DEFINITION_FIELDS))
+    return totals
+
+
+if __name__ == "__main__":
+    # Usage: python -m utils.prompt_encoder [phrase_list] [language]
+    phrase_file = Path(sys.argv[1]) if len(sys.argv) > 1 else Path("data/definition_generator/phrase_list.txt")
+    language = sys.argv[2] if len(sys.argv) > 2 else "Hungarian"
+    with open(phrase_file, "r", encoding="utf-8") as f:
+        phrases = [line.strip() for line in f if line.strip()]
+
+    try:
+        import stanza.client.src.operations.app_ops as stanza_ops
+        stanza_ops.select_language(stanza_ops.language_abreviations[language])
+        phrase_infos = [stanza_ops.process_text(phrase).json() for phrase in phrases]
+    except Exception as e:
+        logging.warning(f"Stanza service unavailable ({e}), using whitespace tokenization.")
+        phrase_infos = [_fallback_phrase_info(phrase) for phrase in phrases]
+
+    for agent, counts in benchmark(phrases, phrase_infos).items():
+        saved = counts["before"] - counts["after"]
+        percent = 100 * saved / counts["before"] if counts["before"] else 0
+        print(f"{agent:<20} before: {counts['before']:>8}  after: {counts['after']:>8}  saved: {saved:>8} ({percent:.1f}%)")
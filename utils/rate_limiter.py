@@ -0,0 +1,188 @@
+import os
+import re
+import time
+import asyncio
+import logging
+import threading
+from datetime import datetime, timezone
+from utils.metrics import get_metrics
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s - %(filename)s - %(funcName)s')
+
+# Conservative starting limits (requests per minute, tokens per minute); the
+# limiter adopts the real values from the provider's rate-limit headers.
+DEFAULT_LIMITS = {
+    "anthropic": (50, 40000),
+    "openai": (500, 30000),
+}
+CHARS_PER_TOKEN = 4
+
+# Anthropic: anthropic-ratelimit-requests-remaining; OpenAI: x-ratelimit-remaining-requests
+HEADER_PREFIXES = ("anthropic-ratelimit-", "x-ratelimit-")
+REQUEST_HEADERS = ("requests-limit", "requests-remaining", "requests-reset")
+TOKEN_HEADERS = ("tokens-limit", "tokens-remaining", "tokens-reset")
+OPENAI_HEADER_ALIASES = {
+    "x-ratelimit-limit-requests": "x-ratelimit-requests-limit",
+    "x-ratelimit-remaining-requests": "x-ratelimit-requests-remaining",
+    "x-ratelimit-reset-requests": "x-ratelimit-requests-reset",
+    "x-ratelimit-limit-tokens": "x-ratelimit-tokens-limit",
+    "x-ratelimit-remaining-tokens": "x-ratelimit-tokens-remaining",
+    "x-ratelimit-reset-tokens": "x-ratelimit-tokens-reset",
+}
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+class TokenBucket:
+    def __init__(self, capacity):
+        self.capacity = float(capacity)
+        self.rate = self.capacity / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount, now):
+        """Take `amount` from the bucket and return how long the caller must wait for it."""
+        self.refill(now)
+        amount = min(amount, self.capacity)
+        self.level -= amount
+        if self.level >= 0:
+            return 0.0
+        return -self.level / self.rate
+
+    def set_limit(self, capacity):
+        if capacity > 0 and capacity != self.capacity:
+            self.capacity = float(capacity)
+            self.rate = self.capacity / 60.0
+            self.level = min(self.level, self.capacity)
+
+
+class RateLimiter:
+    """
+    Shared requests-per-minute and tokens-per-minute limiter.
+
+    Callers reserve capacity before a request and only sleep when a bucket is in
+    deficit or the provider has asked us to back off via `retry-after`.
+    """
+
+    def __init__(self, requests_per_minute, tokens_per_minute, name=None):
+        self.name = name
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+    def _reserve(self, tokens):
+        with self.lock:
+            now = time.monotonic()
+            wait = max(
+                self.requests.reserve(1, now),
+                self.tokens.reserve(tokens, now),
+                self.blocked_until - now
+            )
+            return max(wait, 0.0)
+
+    def acquire(self, tokens=0):
+        wait = self._reserve(tokens)
+        if wait > 0:
+            logging.info(f"Rate limiter waiting {wait:.2f}s")
+            get_metrics().inc("treelex_rate_limit_wait_seconds_total", wait, provider=self.name)
+            time.sleep(wait)
+        return wait
+
+    async def acquire_async(self, tokens=0):
+        wait = self._reserve(tokens)
+        if wait > 0:
+            logging.info(f"Rate limiter waiting {wait:.2f}s")
+            get_metrics().inc("treelex_rate_limit_wait_seconds_total", wait, provider=self.name)
+            await asyncio.sleep(wait)
+        return wait
+
+    def reconcile(self, estimated_tokens, actual_tokens):
+        """Correct the token bucket once the real usage of a request is known."""
+        with self.lock:
+            self.tokens.level = min(self.tokens.capacity, self.tokens.level + estimated_tokens - actual_tokens)
+
+    def back_off(self, seconds):
+        with self.lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    def update_from_headers(self, headers):
+        if not headers:
+            return
+        headers = normalize_headers(headers)
+        with self.lock:
+            now = time.monotonic()
+            for bucket, names in ((self.requests, REQUEST_HEADERS), (self.tokens, TOKEN_HEADERS)):
+                limit_name, remaining_name, reset_name = names
+                for prefix in HEADER_PREFIXES:
+                    limit = _to_float(headers.get(prefix + limit_name))
+                    remaining = _to_float(headers.get(prefix + remaining_name))
+                    if limit is not None:
+                        bucket.set_limit(limit)
+                    if remaining is not None:
+                        bucket.refill(now)
+                        bucket.level = min(bucket.level, remaining)
+                        reset = _parse_reset(headers.get(prefix + reset_name))
+                        if remaining <= 0 and reset:
+                            self.blocked_until = max(self.blocked_until, now + reset)
+
+            retry_after = _to_float(headers.get("retry-after"))
+            if retry_after is not None:
+                self.blocked_until = max(self.blocked_until, now + retry_after)
+
+
+def normalize_headers(headers):
+    """Map OpenAI's `x-ratelimit-remaining-requests` style names onto the Anthropic ordering."""
+    normalized = {}
+    for key, value in headers.items():
+        key = key.lower()
+        normalized[OPENAI_HEADER_ALIASES.get(key, key)] = value
+    return normalized
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _parse_reset(value):
+    """Seconds until reset from an RFC 3339 timestamp (Anthropic) or a duration like `6m0s` (OpenAI)."""
+    if not value:
+        return None
+    seconds = _to_float(value)
+    if seconds is not None:
+        return seconds
+    try:
+        reset_at = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        return max((reset_at - datetime.now(timezone.utc)).total_seconds(), 0.0)
+    except ValueError:
+        pass
+    units = {"h": 3600, "m": 60, "s": 1, "ms": 0.001}
+    parts = re.findall(r"([\d.]+)(ms|h|m|s)", value)
+    if not parts:
+        return None
+    return sum(float(amount) * units[unit] for amount, unit in parts)
+
+
+def estimate_tokens(messages, system=None):
+    text = str(system or "") + "".join(str(message.get("content", "")) for message in messages)
+    return len(text) // CHARS_PER_TOKEN
+
+
+def get_rate_limiter(provider):
+    """Return the process-wide limiter for a provider, creating it on first use."""
+    provider = provider.lower()
+    with _limiters_lock:
+        if provider not in _limiters:
+            rpm, tpm = DEFAULT_LIMITS.get(provider, DEFAULT_LIMITS["anthropic"])
+            rpm = int(os.getenv(f"TREELEX_{provider.upper()}_RPM", rpm))
+            tpm = int(os.getenv(f"TREELEX_{provider.upper()}_TPM", tpm))
+            _limiters[provider] = RateLimiter(rpm, tpm, name=provider)
+        return _limiters[provider]
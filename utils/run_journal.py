@@ -0,0 +1,74 @@
+import os
+import json
+import logging
+import threading
+from pathlib import Path
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s - %(filename)s - %(funcName)s')
+
+
+class RunJournal:
+    """
+    Append-only record of the (phrase, word) stages a run has finished and what they produced.
+
+    Each finished stage is one JSON line, flushed and fsynced before the call returns, so
+    after a crash every recorded stage can be skipped and only the rest is redone. A line
+    cut short by the crash is ignored. Lines are written with a single `write`, which lets
+    the workers of a process pool append to the same journal.
+
+    :param path: Journal file. It is created if missing and extended otherwise.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.lock = threading.Lock()
+        self.results = {}
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if self.path.exists():
+            self.load()
+        self.file = open(self.path, "a", encoding="utf-8")
+        if self._ends_mid_line():
+            # Terminate the line a crash cut short so the next record starts on its own line.
+            self.file.write("\n")
+            self.file.flush()
+
+    def _ends_mid_line(self):
+        if self.path.stat().st_size == 0:
+            return False
+        with open(self.path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) != b"\n"
+
+    def load(self):
+        skipped = 0
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    skipped += 1
+                    continue
+                self.results[(record["phrase"], record["word"])] = record["result"]
+        if skipped:
+            logging.warning(f"Ignored {skipped} incomplete lines in {self.path}")
+        logging.info(f"Resuming from {self.path}: {len(self.results)} finished stages")
+
+    def done(self, phrase, word):
+        return (phrase, word) in self.results
+
+    def result(self, phrase, word):
+        return self.results.get((phrase, word))
+
+    def record(self, phrase, word, result):
+        line = json.dumps({"phrase": phrase, "word": word, "result": result}, ensure_ascii=False, default=str) + "\n"
+        with self.lock:
+            self.results[(phrase, word)] = result
+            self.file.write(line)
+            self.file.flush()
+            os.fsync(self.file.fileno())
+
+    def close(self):
+        with self.lock:
+            if self.file:
+                self.file.close()
+                self.file = None
@@ -0,0 +1,86 @@
+import asyncio
+import threading
+
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key into a single execution.
+
+    The first caller for a key runs the function; callers arriving while it is
+    in flight block and receive the same result (or exception).
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+        self.async_calls = {}
+        self.coalesced = 0
+
+    def do(self, key, fn):
+        with self.lock:
+            call = self.calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.coalesced += 1
+                leader = False
+            else:
+                call = _Call()
+                self.calls[key] = call
+                leader = True
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call.event.set()
+        return call.result
+
+    async def do_async(self, key, coroutine_fn):
+        """
+        Coalescing for coroutines. The call runs as its own task, so cancelling the caller
+        that started it does not cancel it for the callers waiting on the same key.
+        """
+        loop = asyncio.get_running_loop()
+        call_key = (id(loop), key)
+        with self.lock:
+            task = self.async_calls.get(call_key)
+            if task is not None:
+                self.coalesced += 1
+            else:
+                task = loop.create_task(coroutine_fn())
+                self.async_calls[call_key] = task
+                task.add_done_callback(lambda done: self._finish_async(call_key, done))
+        return await asyncio.shield(task)
+
+    def _finish_async(self, call_key, task):
+        with self.lock:
+            if self.async_calls.get(call_key) is task:
+                del self.async_calls[call_key]
+        # Mark the exception as retrieved in case nobody is waiting any more.
+        if not task.cancelled():
+            task.exception()
+
+
+_default_group = SingleFlight()
+
+
+def get_single_flight():
+    return _default_group
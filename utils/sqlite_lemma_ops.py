@@ -0,0 +1,156 @@
+import os
+import json
+import sqlite3
+import logging
+import threading
+from pathlib import Path
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s - %(filename)s - %(funcName)s')
+
+DEFAULT_DB_PATH = Path("data/lexiwebdb.sqlite3")
+# Seconds a writer waits for another connection's transaction.
+BUSY_TIMEOUT = 30
+
+_store = None
+_store_lock = threading.Lock()
+
+
+class StoreResponse:
+    def __init__(self, status_code, payload):
+        self.status_code = status_code
+        self.payload = payload
+
+    def json(self):
+        return self.payload
+
+
+def _sense(enumerated_lemma):
+    suffix = enumerated_lemma.rsplit('_', 1)[-1]
+    return int(suffix) if suffix.isdigit() else 0
+
+
+class SQLiteLemmaStore:
+    """
+    Enumerated lemmas in one indexed SQLite table, an embedded stand-in for lexiwebdb.
+
+    Rows keep lexiwebdb's fields as a JSON document next to the indexed `base_lemma` and
+    sense number, so a base lemma's senses come back in sense order like the API returns
+    them. The database runs in WAL mode, so lookups are not blocked by a writer, and every
+    bulk operation is a single transaction.
+
+    :param path: Database file.
+    """
+
+    def __init__(self, path=DEFAULT_DB_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        connection = self._connection()
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS enumerated_lemmas ("
+            "enumerated_lemma TEXT PRIMARY KEY, base_lemma TEXT NOT NULL, sense INTEGER NOT NULL, data TEXT NOT NULL)"
+        )
+        connection.execute("CREATE INDEX IF NOT EXISTS enumerated_lemmas_base_lemma ON enumerated_lemmas (base_lemma, sense)")
+        connection.commit()
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(str(self.path), timeout=BUSY_TIMEOUT)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def get_by_base_lemmas(self, base_lemmas):
+        base_lemmas = list(base_lemmas)
+        placeholders = ",".join("?" * len(base_lemmas))
+        rows = self._connection().execute(
+            f"SELECT data FROM enumerated_lemmas WHERE base_lemma IN ({placeholders}) ORDER BY base_lemma, sense",
+            base_lemmas
+        ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def insert(self, rows):
+        """Insert `rows` in one transaction. :raises sqlite3.IntegrityError: If one already exists; nothing is written."""
+        connection = self._connection()
+        with connection:
+            connection.executemany(
+                "INSERT INTO enumerated_lemmas (enumerated_lemma, base_lemma, sense, data) VALUES (?, ?, ?, ?)",
+                [(row['enumerated_lemma'], row['base_lemma'], _sense(row['enumerated_lemma']), json.dumps(row, ensure_ascii=False)) for row in rows]
+            )
+
+    def update(self, changes):
+        """
+        Apply {enumerated_lemma: fields} in one transaction.
+
+        :return: The enumerated lemmas that do not exist; nothing is written if there are any.
+        """
+        connection = self._connection()
+        with connection:
+            missing = []
+            for enumerated_lemma, fields in changes.items():
+                row = connection.execute("SELECT data FROM enumerated_lemmas WHERE enumerated_lemma = ?", (enumerated_lemma,)).fetchone()
+                if row is None:
+                    missing.append(enumerated_lemma)
+                    continue
+                data = json.loads(row[0])
+                data.update(fields)
+                connection.execute("UPDATE enumerated_lemmas SET data = ? WHERE enumerated_lemma = ?", (json.dumps(data, ensure_ascii=False), enumerated_lemma))
+            if missing:
+                connection.rollback()
+        return missing
+
+
+def get_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = SQLiteLemmaStore(os.getenv("TREELEX_SQLITE_LEMMA_DB", DEFAULT_DB_PATH))
+        return _store
+
+
+def _record(data):
+    """A row as lexiwebdb stores it; idempotency keys from the bulk writer are not part of it."""
+    return {key: value for key, value in data.items() if key != 'idempotency_key'}
+
+
+def get_enumerated_lemma_by_base_lemma(base_lemma):
+    enumerated_lemmas = get_store().get_by_base_lemmas([base_lemma])
+    if not enumerated_lemmas:
+        return StoreResponse(404, {"error": f"No enumerated lemmas found for base lemma: {base_lemma}"})
+    return StoreResponse(200, {"enumerated_lemmas": enumerated_lemmas})
+
+
+def get_enumerated_lemmas_by_base_lemmas(base_lemmas):
+    return StoreResponse(200, {"enumerated_lemmas": get_store().get_by_base_lemmas(base_lemmas)})
+
+
+def create_enumerated_lemma(data):
+    try:
+        get_store().insert([_record(data)])
+    except sqlite3.IntegrityError:
+        raise ValueError(f"Enumerated Lemma already exists: {data['enumerated_lemma']}")
+    return StoreResponse(201, {"enumerated_lemma": data['enumerated_lemma']})
+
+
+def bulk_create_enumerated_lemmas(data):
+    try:
+        get_store().insert([_record(row) for row in data])
+    except sqlite3.IntegrityError as e:
+        # Nothing was written; the bulk writer retries row by row and resolves the collision.
+        return StoreResponse(409, {"error": f"Enumerated Lemma already exists: {e}"})
+    return StoreResponse(201, {"created": len(data)})
+
+
+def update_enumerated_lemma(enumerated_lemma, data):
+    if get_store().update({enumerated_lemma: data}):
+        return StoreResponse(404, {"error": f"Enumerated lemma not found: {enumerated_lemma}"})
+    return StoreResponse(200, {"enumerated_lemma": enumerated_lemma})
+
+
+def bulk_update_enumerated_lemmas(data):
+    missing = get_store().update({row['enumerated_lemma']: row['data'] for row in data})
+    if missing:
+        return StoreResponse(409, {"error": f"Enumerated lemmas not found: {missing}"})
+    return StoreResponse(200, {"updated": len(data)})
@@ -0,0 +1,51 @@
+import logging
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s - %(filename)s - %(funcName)s')
+
+# Phrases sent to the Stanza service per request.
+DEFAULT_BATCH_SIZE = 200
+# Stanza always starts a new paragraph, and therefore a new sentence, at a blank line.
+PHRASE_SEPARATOR = "\n\n"
+
+
+def join_phrases(phrases):
+    """Build one document from `phrases` and return it with the character span of each phrase."""
+    spans = []
+    position = 0
+    for phrase in phrases:
+        spans.append((position, position + len(phrase)))
+        position += len(phrase) + len(PHRASE_SEPARATOR)
+    return PHRASE_SEPARATOR.join(phrases), spans
+
+
+def split_analysis(document, spans, sentences):
+    """
+    Assign the sentences Stanza returned for a joined document back to their phrases.
+
+    Sentences are located by their text, in order, and given to the phrase whose span
+    contains them.
+
+    :return: One list of sentences per phrase, or None if a sentence could not be placed
+             or straddles two phrases.
+    """
+    per_phrase = [[] for _ in spans]
+    cursor = 0
+    index = 0
+    for sentence in sentences:
+        text = sentence.get("text", "")
+        start = document.find(text, cursor) if text else -1
+        if start < 0:
+            logging.warning(f"Could not locate sentence {text!r} in the batched document")
+            return None
+        cursor = start + len(text)
+        while index < len(spans) and start >= spans[index][1]:
+            index += 1
+        if index == len(spans) or start < spans[index][0] or cursor > spans[index][1]:
+            return None
+        per_phrase[index].append(sentence)
+    return per_phrase
+
+
+def chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
@@ -0,0 +1,76 @@
+import json
+import threading
+from jsonschema import Draft7Validator
+from jsonschema.exceptions import ValidationError
+
+_validators = {}
+_validators_lock = threading.Lock()
+
+
+def schema_key(schema):
+    return json.dumps(schema, sort_keys=True, ensure_ascii=False)
+
+
+def get_validator(schema):
+    """Compile `schema` once and reuse the validator for every reply checked against it."""
+    key = schema_key(schema)
+    validator = _validators.get(key)
+    if validator is None:
+        Draft7Validator.check_schema(schema)
+        with _validators_lock:
+            validator = _validators.setdefault(key, Draft7Validator(schema))
+    return validator
+
+
+def parse_structured_output(content, schema):
+    """
+    Decode a structured reply and validate it against `schema`.
+
+    :raises ValidationError: If the reply is not JSON or does not match the schema.
+    """
+    try:
+        result = json.loads(content) if isinstance(content, str) else content
+    except json.JSONDecodeError as e:
+        raise ValidationError(f"Reply is not valid JSON: {e}")
+    error = next(iter(get_validator(schema).iter_errors(result)), None)
+    if error is not None:
+        raise error
+    return result
+
+
+def is_strict_schema(schema):
+    """Whether OpenAI's strict mode accepts `schema`: closed objects whose properties are all required."""
+    if not isinstance(schema, dict):
+        return True
+    if schema.get("type") == "object":
+        properties = schema.get("properties", {})
+        if schema.get("additionalProperties") is not False or set(schema.get("required", [])) != set(properties):
+            return False
+        if not all(is_strict_schema(value) for value in properties.values()):
+            return False
+    if "items" in schema and not is_strict_schema(schema["items"]):
+        return False
+    return True
+
+
+def anthropic_tool(schema, name):
+    return {
+        "name": name,
+        "description": "Return the answer in this exact structure.",
+        "input_schema": schema,
+    }
+
+
+def openai_response_format(schema, name):
+    return {
+        "type": "json_schema",
+        "json_schema": {"name": name, "schema": schema, "strict": is_strict_schema(schema)},
+    }
+
+
+def tool_use_json(content, name):
+    """The arguments the model passed to tool `name`, as JSON text."""
+    for block in content:
+        if getattr(block, "type", None) == "tool_use" and block.name == name:
+            return json.dumps(block.input, ensure_ascii=False)
+    raise ValidationError(f"Reply did not call the {name} tool")